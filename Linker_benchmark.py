@@ -0,0 +1,471 @@
+"""Offline benchmarks for Linker_main.
+
+Runs the fetch, match and link threads against an in-process stand-in for the parts of the
+Drive v3 and Sheets v4 APIs the app uses, so throughput can be measured without Google:
+
+    python Linker_benchmark.py --sizes 1000 10000 100000 --latency 0.005 --error-rate 0.01
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import Linker_main
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+PDF_MIME_TYPE = 'application/pdf'
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+class FakeHttpError(Exception):
+    """Looks enough like googleapiclient.errors.HttpError for the retry logic."""
+    def __init__(self, status, reason):
+        super().__init__(f"<HttpError {status} {reason}>")
+        self.resp = FakeResponse(status)
+        self.content = json.dumps({'error': {'errors': [{'reason': reason}]}}).encode('utf-8')
+
+class FakeBackend:
+    """Shared state, latency and request counters of the fake Google APIs."""
+    def __init__(self, latency=0.0, error_rate=0.0, page_size=100, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.files = {}  # Drive file id -> file dict
+        self.children = {}  # Drive folder id -> [file ids]
+        self.sheets = {}  # Spreadsheet id -> {tab name: {column letter: [values]}}
+        self.changes = []  # Changes API log; a page token is a position in it
+        self.requests = Counter()
+        self.errors = Counter()
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add_file(self, file):
+        self.files[file['id']] = file
+        for parent in file.get('parents', []):
+            self.children.setdefault(parent, []).append(file['id'])
+        self.changes.append({'fileId': file['id'], 'removed': False, 'file': file})
+
+    def call(self, endpoint, handler):
+        """Simulate one HTTP round trip: latency, injected 429s and accounting."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests[endpoint] += 1
+            fail = self.error_rate and self.random.random() < self.error_rate
+            if fail:
+                self.errors[endpoint] += 1
+        if fail:
+            raise FakeHttpError(429, 'rateLimitExceeded')
+        response = handler()
+        with self._lock:
+            self.bytes += len(json.dumps(response, default=str))
+        return response
+
+class FakeRequest:
+    def __init__(self, backend, endpoint, handler):
+        self.backend = backend
+        self.endpoint = endpoint
+        self.methodId = endpoint  # Named like googleapiclient's HttpRequest attribute
+        self.handler = handler
+
+    def execute(self, **kwargs):
+        return self.backend.call(self.endpoint, self.handler)
+
+QUERY_CLAUSE = re.compile(r"""\s*(?:
+    '(?P<parent>(?:[^'\\]|\\.)*)'\s+in\s+parents |
+    (?P<field>name|mimeType)\s*(?P<op>=|!=|\s+contains\s+)\s*'(?P<value>(?:[^'\\]|\\.)*)' |
+    trashed\s*=\s*(?P<trashed>true|false)
+)\s*""", re.VERBOSE)
+
+def unescape(value):
+    return re.sub(r"\\(.)", r"\1", value)
+
+def parse_query(q):
+    """Turn a Drive 'q' expression of and-ed clauses (or parenthesized or-groups) into a predicate on file dicts."""
+    tests = []
+    for clause in re.split(r"\s+and\s+", q or ''):
+        clause = clause.strip()
+        if clause.startswith('(') and clause.endswith(')'):
+            alternatives = [parse_query(alternative) for alternative in re.split(r"\s+or\s+", clause[1:-1])]
+            tests.append(lambda file, alternatives=alternatives: any(test(file) for test in alternatives))
+            continue
+        match = QUERY_CLAUSE.fullmatch(clause)
+        if not match:
+            raise ValueError(f"Unsupported query clause: {clause!r}")
+        if match.group('parent') is not None:
+            parent = unescape(match.group('parent'))
+            tests.append(lambda file, parent=parent: parent in file.get('parents', []))
+        elif match.group('trashed') is not None:
+            trashed = match.group('trashed') == 'true'
+            tests.append(lambda file, trashed=trashed: file.get('trashed', False) == trashed)
+        else:
+            field, op, value = match.group('field'), match.group('op').strip(), unescape(match.group('value'))
+            if op == '=':
+                tests.append(lambda file, field=field, value=value: file.get(field) == value)
+            elif op == '!=':
+                tests.append(lambda file, field=field, value=value: file.get(field) != value)
+            else:
+                tests.append(lambda file, field=field, value=value: value.lower() in file.get(field, '').lower())
+    return lambda file: all(test(file) for test in tests)
+
+def select_fields(file, fields):
+    """Apply the files(...) part of a fields mask, as Drive does, so payload sizes are realistic."""
+    match = re.search(r"files\(([^)]*)\)", fields or '')
+    if not match:
+        return dict(file)
+    names = [name.strip() for name in match.group(1).split(',')]
+    return {name: file[name] for name in names if name in file}
+
+class FakeFiles:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def list(self, q=None, fields=None, pageToken=None, pageSize=None, **kwargs):
+        def handler():
+            match = re.match(r"\s*'((?:[^'\\]|\\.)*)'\s+in\s+parents", q or '')
+            if match:  # Use the parent index instead of scanning every file
+                candidates = [self.backend.files[file_id] for file_id in self.backend.children.get(unescape(match.group(1)), [])]
+            else:
+                candidates = list(self.backend.files.values())
+            test = parse_query(q)
+            matching = [file for file in candidates if test(file)]
+            start = int(pageToken or 0)
+            size = min(pageSize or self.backend.page_size, 1000)
+            response = {'files': [select_fields(file, fields) for file in matching[start:start + size]]}
+            if start + size < len(matching):
+                response['nextPageToken'] = str(start + size)
+            return response
+        return FakeRequest(self.backend, 'drive.files.list', handler)
+
+    def get(self, fileId=None, fields=None, **kwargs):
+        def handler():
+            file = self.backend.files.get(fileId)
+            if file is None:
+                raise FakeHttpError(404, 'notFound')
+            return file
+        return FakeRequest(self.backend, 'drive.files.get', handler)
+
+class FakeChanges:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self.backend, 'drive.changes.getStartPageToken',
+                           lambda: {'startPageToken': str(len(self.backend.changes))})
+
+    def list(self, pageToken=None, pageSize=None, **kwargs):
+        def handler():
+            start = int(pageToken)
+            end = min(len(self.backend.changes), start + (pageSize or self.backend.page_size))
+            response = {'changes': [dict(change) for change in self.backend.changes[start:end]]}
+            if end < len(self.backend.changes):
+                response['nextPageToken'] = str(end)
+            else:
+                response['newStartPageToken'] = str(end)
+            return response
+        return FakeRequest(self.backend, 'drive.changes.list', handler)
+
+class FakeBatch:
+    """Stand-in for a Drive BatchHttpRequest; each sub-request may fail on its own."""
+    def __init__(self, backend, callback):
+        self.backend = backend
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, **kwargs):
+        def handler():
+            results = []
+            for request_id, request in self.requests:
+                with self.backend._lock:
+                    self.backend.requests[request.endpoint + '(batched)'] += 1
+                    fail = self.backend.error_rate and self.backend.random.random() < self.backend.error_rate
+                try:
+                    if fail:
+                        raise FakeHttpError(429, 'rateLimitExceeded')
+                    results.append((request_id, request.handler(), None))
+                except FakeHttpError as e:
+                    results.append((request_id, None, e))
+            return results
+        for request_id, response, error in self.backend.call('drive.batch', handler):
+            self.callback(request_id, response, error)
+
+class FakeDrive:
+    """Stand-in for build('drive', 'v3')."""
+    def __init__(self, backend):
+        self.backend = backend
+
+    def files(self):
+        return FakeFiles(self.backend)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self.backend, callback)
+
+    def changes(self):
+        return FakeChanges(self.backend)
+
+def parse_range(range_name):
+    """Split "'Tab'!A1:B2" into (tab, first column, first row, last row); rows are None when open."""
+    tab, _, cells = range_name.rpartition('!')
+    tab = tab[1:-1].replace("''", "'") if tab.startswith("'") else tab
+    first, _, last = cells.partition(':')
+    first_match = re.fullmatch(r'([A-Z]+)(\d*)', first)
+    last_match = re.fullmatch(r'([A-Z]+)(\d*)', last or first)
+    first_row = int(first_match.group(2)) if first_match.group(2) else 1
+    last_row = int(last_match.group(2)) if last_match.group(2) else None
+    return tab, first_match.group(1), first_row, last_row
+
+class FakeValues:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _column(self, spreadsheet_id, range_name):
+        tab, column, first_row, last_row = parse_range(range_name)
+        tabs = self.backend.sheets[spreadsheet_id]
+        columns = tabs[tab] if tab else next(iter(tabs.values()))
+        return columns.setdefault(column, []), first_row, last_row
+
+    def get(self, spreadsheetId=None, range=None, **kwargs):
+        def handler():
+            values, first_row, last_row = self._column(spreadsheetId, range)
+            selected = values[first_row - 1:last_row]
+            while selected and selected[-1] in ('', None):
+                selected.pop()
+            return {'range': range, 'values': [[value] if value not in ('', None) else [] for value in selected]}
+        return FakeRequest(self.backend, 'sheets.values.get', handler)
+
+    def batchGet(self, spreadsheetId=None, ranges=None, **kwargs):
+        def handler():
+            value_ranges = []
+            for range_name in ranges:
+                values, first_row, last_row = self._column(spreadsheetId, range_name)
+                selected = values[first_row - 1:last_row]
+                value_ranges.append({'range': range_name, 'values': [[value] if value not in ('', None) else [] for value in selected]})
+            return {'valueRanges': value_ranges}
+        return FakeRequest(self.backend, 'sheets.values.batchGet', handler)
+
+    def _write(self, spreadsheet_id, range_name, rows):
+        values, first_row, _ = self._column(spreadsheet_id, range_name)
+        for offset, row in enumerate(rows):
+            position = first_row - 1 + offset
+            values.extend([''] * (position + 1 - len(values)))
+            values[position] = row[0] if row else ''
+
+    def update(self, spreadsheetId=None, range=None, body=None, **kwargs):
+        def handler():
+            self._write(spreadsheetId, range, body['values'])
+            return {'updatedCells': len(body['values'])}
+        return FakeRequest(self.backend, 'sheets.values.update', handler)
+
+    def batchUpdate(self, spreadsheetId=None, body=None, **kwargs):
+        def handler():
+            for data in body['data']:
+                self._write(spreadsheetId, data['range'], data['values'])
+            return {'totalUpdatedCells': sum(len(data['values']) for data in body['data'])}
+        return FakeRequest(self.backend, 'sheets.values.batchUpdate', handler)
+
+class FakeSpreadsheets:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, spreadsheetId=None, **kwargs):
+        def handler():
+            tabs = self.backend.sheets[spreadsheetId]
+            return {'spreadsheetId': spreadsheetId, 'sheets': [{'properties': {
+                'title': title,
+                'gridProperties': {'rowCount': max([len(values) for values in columns.values()] + [1000]), 'columnCount': 26},
+            }} for title, columns in tabs.items()]}
+        return FakeRequest(self.backend, 'sheets.spreadsheets.get', handler)
+
+    def values(self):
+        return FakeValues(self.backend)
+
+class FakeSheets:
+    """Stand-in for build('sheets', 'v4')."""
+    def __init__(self, backend):
+        self.backend = backend
+
+    def spreadsheets(self):
+        return FakeSpreadsheets(self.backend)
+
+class FakeClientFactory:
+    """Stand-in for Linker_main.clients."""
+    def __init__(self, backend):
+        self.backend = backend
+
+    def credentials(self):
+        return None
+
+    def drive(self):
+        return FakeDrive(self.backend)
+
+    def sheets(self):
+        return FakeSheets(self.backend)
+
+def make_dataset(backend, file_count, folder_count=10, match_ratio=0.8, seed=0):
+    """Create folders of numbered PDFs and a sheet whose ID column matches match_ratio of them."""
+    rng = random.Random(seed)
+    folders = []
+    for folder_number in range(folder_count):
+        folder = {'id': f'folder{folder_number}', 'name': f'Intake {folder_number}', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root']}
+        backend.add_file(folder)
+        folders.append(folder)
+    name_patterns = ['{n}.pdf', 'Scan {n}.pdf', 'Invoice {n} (1).pdf', 'notes {n}.txt']
+    for number in range(1, file_count + 1):
+        folder = folders[number % folder_count]
+        name = rng.choice(name_patterns).format(n=number)
+        backend.add_file({
+            'id': f'file{number}', 'name': name, 'parents': [folder['id']],
+            'mimeType': PDF_MIME_TYPE if name.endswith('.pdf') else 'text/plain',
+            'webViewLink': f'https://drive.google.com/file/d/file{number}/view',
+        })
+    ids = [str(number) for number in range(1, file_count + 1) if rng.random() < match_ratio]
+    rng.shuffle(ids)
+    backend.sheets['sheet1'] = {'Sheet1': {'A': ['ID'] + ids}}
+    return [folder['name'] for folder in folders]
+
+def reset_app_state():
+    """Forget rows, caches and metrics left over from a previous run."""
+    Linker_main.row_store.clear()
+    Linker_main.folder_name_cache.clear()
+    Linker_main.folder_search_cache.clear()
+    Linker_main.spreadsheet_metadata.invalidate()
+    Linker_main.displayed_folder_ids.clear()
+    Linker_main.folder_paths.clear()
+    Linker_main.folder_file_count.clear()
+    Linker_main.drive_cache = Linker_main.DriveCache(':memory:')
+    Linker_main.metrics = Linker_main.Metrics()
+
+def measure(backend, phase, func):
+    """Run func() and return its wall time, requests, bytes and peak traced memory."""
+    requests_before = Counter(backend.requests)
+    bytes_before = backend.bytes
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # The app is chatty; keep the report readable
+        result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    requests = backend.requests - requests_before
+    return result, {
+        'phase': phase,
+        'seconds': round(elapsed, 3),
+        'requests': sum(requests.values()),
+        'by_endpoint': dict(requests),
+        'bytes': backend.bytes - bytes_before,
+        'peak_mb': round(peak / 1024 / 1024, 1),
+    }
+
+def run_threads(*threads):
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return threads
+
+def benchmark(file_count, options):
+    """Benchmark fetch, match, link and the one-pass stream mode on a synthetic dataset of file_count files."""
+    backend = FakeBackend(options.latency, options.error_rate, options.page_size, options.seed)
+    folders = make_dataset(backend, file_count, options.folders, seed=options.seed)
+    Linker_main.clients = FakeClientFactory(backend)
+    reset_app_state()
+    sheets = FakeSheets(backend)
+
+    results = []
+    journal_dir = tempfile.mkdtemp(prefix='linker-journal-')  # Keep benchmark journals out of the repo
+    _, report = measure(backend, 'fetch', lambda: run_threads(
+        Linker_main.BackgroundFetchThread(None, folders, options.workers)))
+    results.append(report)
+    (matching_thread,), report = measure(backend, 'match', lambda: run_threads(
+        Linker_main.MatchingValuesThread(sheets, 'sheet1', 'Sheet1', 'A', None, 'B')))
+    results.append(report)
+    (extract_thread,), report = measure(backend, 'link', lambda: run_threads(
+        Linker_main.ExtractItemsThread(None, sheets, 'sheet1', options.batch_size, 'Sheet1', journal_dir=journal_dir)))
+    results.append(report)
+    Linker_main.row_store.clear()
+    (stream_thread,), report = measure(backend, 'stream', lambda: run_threads(  # Links into a fresh column
+        Linker_main.StreamingLinkThread(None, folders, sheets, 'sheet1', 'Sheet1', 'A', 'C', options.workers, options.batch_size,
+                                        journal_dir=journal_dir)))
+    results.append(report)
+
+    rows = len(Linker_main.row_store)
+    for report in results:
+        report['size'] = file_count
+        report['rows_per_second'] = round(rows / report['seconds']) if report['seconds'] else None
+    results[1]['matched'] = len(matching_thread.matched_values)
+    results[2]['written'] = extract_thread.written_cells
+    results[2]['failed'] = len(extract_thread.failed_cells)
+    results[3]['written'] = stream_thread.written_cells
+    return results
+
+def check_cli():
+    """Sanity checks of the headless option parsing, run before benchmarking."""
+    options = Linker_main.parse_args(['--folders', 'Intake', '--target', 'sheet1', 'Sheet1', 'a', 'b'])
+    single = {option: options.get(option) for option in Linker_main.TARGET_KEYS}
+    # One --target is the same as the single-target options
+    assert single == {'spreadsheet_id': 'sheet1', 'tab': 'Sheet1', 'id_column': 'A', 'link_column': 'B'}, single
+    assert not options['targets'], options['targets']
+    # --folder-id adds folders by ID, next to or instead of --folders
+    options = Linker_main.parse_args(['--folders', 'Intake', '--folder-id', 'f1', '--folder-id', 'f2',
+                                      '--spreadsheet-id', 'sheet1', '--tab', 'Sheet1', '--id-column', 'A', '--link-column', 'B'])
+    assert options['folders'] == ['Intake', {'id': 'f1', 'name': None}, {'id': 'f2', 'name': None}], options['folders']
+    options = Linker_main.parse_args(['--folder-id', 'f1', '--spreadsheet-id', 'sheet1', '--tab', 'Sheet1',
+                                      '--id-column', 'A', '--link-column', 'B'])
+    assert options['folders'] == [{'id': 'f1', 'name': None}], options['folders']
+
+def check_id_patterns():
+    """The built-in filename ID rules find IDs but do not mistake date prefixes for them."""
+    names = ['00042_scan.pdf', 'INV-2024-00042.pdf', 'Scan 123.pdf', '123 (1).pdf',
+             '2024-01-15 invoice.pdf', '20240115_scan.pdf', '2024-01 report.pdf']
+    ids, _ = Linker_main.extract_ids(names)
+    assert ids == ['42', '42', '123', '123', None, None, None], list(zip(names, ids))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Linker_main against a fake Drive/Sheets service.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Numbers of files to generate")
+    parser.add_argument('--folders', type=int, default=10, help="Number of folders the files are spread over")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every fake request")
+    parser.add_argument('--page-size', dest='page_size', type=int, default=100, help="Default Drive list page size")
+    parser.add_argument('--error-rate', dest='error_rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--workers', type=int, default=None, help="Folder fetch workers")
+    parser.add_argument('--batch-size', dest='batch_size', type=int, default=None, help="Cells per batchUpdate request")
+    parser.add_argument('--rate', type=float, default=10000, help="Requests per second allowed by the rate limiters")
+    parser.add_argument('--retry-delay', dest='retry_delay', type=float, default=0.01, help="Base retry delay in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    options = parser.parse_args()
+    check_cli()
+    check_id_patterns()
+
+    Linker_main.drive_limiter.configure(options.rate, options.rate)
+    Linker_main.sheets_limiter.configure(options.rate, options.rate)
+    Linker_main.RETRY_BASE_DELAY = options.retry_delay
+
+    tracemalloc.start()
+    all_results = []
+    print(f"{'size':>8} {'phase':<6} {'seconds':>8} {'requests':>9} {'KB':>9} {'peak MB':>8} {'rows/s':>9}")
+    for size in options.sizes:
+        for report in benchmark(size, options):
+            all_results.append(report)
+            print(f"{report['size']:>8} {report['phase']:<6} {report['seconds']:>8} {report['requests']:>9} "
+                  f"{report['bytes'] // 1024:>9} {report['peak_mb']:>8} {report['rows_per_second'] or '-':>9}")
+    print(f"Limiter stats: drive {Linker_main.drive_limiter.stats()}, sheets {Linker_main.sheets_limiter.stats()}")
+    if options.json:
+        with open(options.json, 'w') as results_file:
+            json.dump(all_results, results_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,834 @@
+import time  # For periodic update delay
+START_TIME = time.perf_counter()  # Used to report window startup time
 import os
+import sys
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import time  # For periodic update delay
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import json
+import random
+import queue
+import itertools
+import sqlite3
+import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import re
-
-# Import ttkbootstrap Style
-from ttkbootstrap import Style
+import hashlib
+import math
+import contextlib
+import tracemalloc
+import logging
+try:
+    import resource  # Peak RSS; not available on Windows
+except ImportError:
+    resource = None
+# Google client libraries and ttkbootstrap are imported on first use to keep startup fast
 
 # Define Google Drive API scope
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly', 'https://www.googleapis.com/auth/spreadsheets']
 
+LOG_LEVEL = logging.INFO  # DEBUG also logs every sheet value and match
+log = logging.getLogger("linker")
+
 labels_frame = None  # Define labels_frame globally
 folder_file_count = {}  # Dictionary to store folder file counts
 
+# Request budgets (requests per second and burst size) for the shared rate limiters
+DRIVE_REQUESTS_PER_SECOND = 20
+DRIVE_BURST = 40
+SHEETS_REQUESTS_PER_SECOND = 1
+SHEETS_BURST = 5
+MAX_RETRIES = 6  # Retries of one request on rate limit / server errors
+RETRY_BASE_DELAY = 1.0  # Seconds, doubled on each retry
+RETRY_MAX_DELAY = 64.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+class RateLimiter:
+    """Adaptive token bucket shared by every thread calling one Google API.
+
+    The refill rate is halved whenever the API throttles us and creeps back up to the
+    configured budget on successful calls, so callers run as fast as the quota allows.
+    """
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttles = 0
+        self.retries = 0
+
+    def acquire(self, cost=1):
+        """Block until cost request tokens are available (a batch request costs one per call)."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                needed = min(cost, self.burst)  # Large batches may overdraw the bucket
+                if self._tokens >= needed:
+                    self._tokens -= cost
+                    self.requests += cost
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        """Slowly restore the rate after a successful call."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_retry(self, throttled):
+        """Record a retry; halve the rate if the API throttled us."""
+        with self._lock:
+            self.retries += 1
+            if throttled:
+                self.throttles += 1
+                self.rate = max(self.max_rate / 32, self.rate / 2)
+                self._tokens = min(self._tokens, 0)
+
+    def configure(self, rate=None, burst=None):
+        """Change the request budget."""
+        with self._lock:
+            if rate is not None:
+                self.max_rate = self.rate = float(rate)
+            if burst is not None:
+                self.burst = float(burst)
+
+    def stats(self):
+        """Return the request, throttle and retry counters."""
+        with self._lock:
+            return {'requests': self.requests, 'throttles': self.throttles, 'retries': self.retries, 'rate': round(self.rate, 2)}
+
+drive_limiter = RateLimiter('drive', DRIVE_REQUESTS_PER_SECOND, DRIVE_BURST)  # Drive reads
+sheets_limiter = RateLimiter('sheets', SHEETS_REQUESTS_PER_SECOND, SHEETS_BURST)  # Sheets reads and writes
+
+def error_status(error):
+    """Return (HTTP status, rate limit reason) of an API error, or (None, None)."""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    reason = None
+    content = getattr(error, 'content', None)
+    if content:
+        try:
+            details = json.loads(content.decode('utf-8') if isinstance(content, bytes) else content)
+            errors = details.get('error', {}).get('errors', [])
+            reason = errors[0].get('reason') if errors else details.get('error', {}).get('status')
+        except (ValueError, AttributeError):
+            pass
+    try:
+        status = int(status) if status is not None else None
+    except (TypeError, ValueError):
+        status = None
+    return status, reason
+
+def is_rate_limit_error(error):
+    """Return True if the error is a quota/rate limit response (429 or 403 rateLimitExceeded)."""
+    status, reason = error_status(error)
+    return status == 429 or (status == 403 and reason in RATE_LIMIT_REASONS)
+
+def is_retryable_error(error):
+    """Return True if the request may succeed when retried."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status, reason = error_status(error)
+    return status in RETRYABLE_STATUS_CODES or is_rate_limit_error(error)
+
+METRICS_PATH = None  # Write the run metrics here after every phase (.prom: Prometheus text format, else JSON)
+PROFILE_DIR = None  # Write per-phase cProfile and tracemalloc reports here
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+def percentile(values, quantile):
+    """Return the quantile of values by the nearest-rank method, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(quantile * len(ordered)) - 1)], 4)
+
+def peak_rss_bytes():
+    """Return the process's peak resident memory in bytes, or None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports kilobytes
+
+def profile_file_name(phase_name):
+    """Turn a phase name, which may hold a link target like 'sheet/Tab!A->B', into a safe file name."""
+    slug = re.sub(r'[^A-Za-z0-9._-]+', '_', phase_name).strip('_.') or 'phase'
+    if slug == phase_name:
+        return slug
+    return f"{slug}-{hashlib.sha1(phase_name.encode()).hexdigest()[:8]}"  # Names that slug alike stay apart
+
+class Phase:
+    """Counters of one fetch, match, link or stream phase."""
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.finished = None
+        self.rows = 0  # Rows the phase processed, set by the phase
+        self.calls = {}  # Endpoint -> [calls, retries, bytes, [latencies]]
+        self.peak_memory = None
+        self.profile = None  # cProfile.Profile of the phase's own thread, in profiler mode
+
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self):
+        """Return the phase counters as plain data."""
+        seconds = self.seconds()
+        endpoints = {}
+        for endpoint, (calls, retries, size, latencies) in self.calls.items():
+            endpoints[endpoint] = {
+                'calls': calls, 'retries': retries, 'bytes': size,
+                'latency': {str(quantile): percentile(latencies, quantile) for quantile in LATENCY_QUANTILES},
+            }
+        return {
+            'phase': self.name, 'running': self.finished is None, 'seconds': round(seconds, 3), 'rows': self.rows,
+            'rows_per_second': round(self.rows / seconds, 1) if seconds else None,
+            'calls': sum(entry['calls'] for entry in endpoints.values()),
+            'retries': sum(entry['retries'] for entry in endpoints.values()),
+            'bytes': sum(entry['bytes'] for entry in endpoints.values()),
+            'latency': {str(quantile): percentile([latency for entry in self.calls.values() for latency in entry[3]], quantile)
+                        for quantile in LATENCY_QUANTILES},
+            'peak_memory': self.peak_memory, 'endpoints': endpoints,
+        }
+
+class Metrics:
+    """Per-phase API and throughput counters, shown in the Summary panel and optionally saved to a file."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = OrderedDict()  # Name -> Phase of the latest run of each phase
+        self._local = threading.local()  # .phases: phases running on this thread, innermost last
+        self._write_lock = threading.Lock()  # Phases on several threads may finish at once
+
+    def _stack(self):
+        return self._local.__dict__.setdefault('phases', [])
+
+    def current(self):
+        """Return the innermost phase running on the calling thread, or None."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a phase; API calls this thread (or work handed on with bind) makes while it runs are counted against it."""
+        current = Phase(name)
+        with self._lock:
+            self.phases.pop(name, None)  # A re-run replaces the previous record
+            self.phases[name] = current
+        if PROFILE_DIR:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            current.profile = self.start_profile(name)
+        stack = self._stack()
+        stack.append(current)
+        try:
+            yield current
+        finally:
+            stack.pop()
+            if current.profile:
+                current.profile.disable()
+            with self._lock:
+                current.finished = time.perf_counter()
+            self.finish_phase(current)
+
+    def finish_phase(self, phase):
+        if PROFILE_DIR and tracemalloc.is_tracing():
+            phase.peak_memory = tracemalloc.get_traced_memory()[1]
+            self.write_profile(phase)
+        else:
+            phase.peak_memory = peak_rss_bytes()
+        summary = phase.summary()
+        print_to_console(f"{phase.name}: {summary['seconds']}s, {summary['rows']} rows, {summary['calls']} API calls, "
+                         f"{summary['retries']} retries, {summary['bytes']} bytes")
+        if METRICS_PATH:
+            self.write(METRICS_PATH)
+
+    def record(self, endpoint, latency, size=0, retried=False):
+        """Count one API call attempt against the calling thread's phase."""
+        phase = self.current()
+        if phase is None:
+            return
+        with self._lock:
+            entry = phase.calls.setdefault(endpoint, [0, 0, 0, []])
+            if retried:
+                entry[1] += 1
+            else:
+                entry[0] += 1
+                entry[2] += size
+            entry[3].append(latency)
+
+    @staticmethod
+    def start_profile(name):
+        """Start profiling the calling thread, or return None if another profiler is active.
+
+        Python 3.12+ allows one active profiler per process, so of phases running at the
+        same time only the first is profiled.
+        """
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            print_to_console(f"Not profiling {name}: {str(e)}")
+            return None
+        return profile
+
+    def bind(self, func):
+        """Wrap func so that, on whatever thread it runs, it counts against the caller's current phase."""
+        phase = self.current()
+        if phase is None:
+            return func
+
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            stack.append(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stack.pop()
+        return wrapper
+
+    def write_profile(self, phase):
+        """Dump the phase's cProfile stats and top allocation sites to PROFILE_DIR."""
+        import io
+        import pstats
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, profile_file_name(phase.name))
+        if phase.profile:
+            pstats.Stats(phase.profile).dump_stats(base + '.prof')
+            report = io.StringIO()
+            pstats.Stats(base + '.prof', stream=report).sort_stats('cumulative').print_stats(40)
+            with open(base + '.txt', 'w') as report_file:
+                report_file.write(report.getvalue())
+        with open(base + '-memory.txt', 'w') as report_file:
+            report_file.write(f"Peak traced memory: {phase.peak_memory} bytes\n")
+            for stat in tracemalloc.take_snapshot().statistics('lineno')[:30]:
+                report_file.write(f"{stat}\n")
+        print_to_console(f"Profile of {phase.name} written to {base}.*")
+
+    def snapshot(self):
+        """Return the summary of every phase, in run order."""
+        with self._lock:
+            return [phase.summary() for phase in self.phases.values()]
+
+    def prometheus(self):
+        """Return the metrics in Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP linker_{name} {help_text}")
+            lines.append(f"# TYPE linker_{name} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                    lines.append(f"linker_{name}{{{label_text}}} {value}")
+
+        phases = self.snapshot()
+        per_endpoint = [(summary['phase'], endpoint, entry) for summary in phases for endpoint, entry in summary['endpoints'].items()]
+        metric('phase_seconds', 'gauge', "Wall time of the phase.", [({'phase': p['phase']}, p['seconds']) for p in phases])
+        metric('phase_rows', 'gauge', "Rows processed by the phase.", [({'phase': p['phase']}, p['rows']) for p in phases])
+        metric('phase_rows_per_second', 'gauge', "Rows processed per second.", [({'phase': p['phase']}, p['rows_per_second']) for p in phases])
+        metric('phase_peak_memory_bytes', 'gauge', "Peak memory at the end of the phase.", [({'phase': p['phase']}, p['peak_memory']) for p in phases])
+        metric('api_calls_total', 'counter', "API calls issued.",
+               [({'phase': phase, 'endpoint': endpoint}, entry['calls']) for phase, endpoint, entry in per_endpoint])
+        metric('api_retries_total', 'counter', "API calls retried.",
+               [({'phase': phase, 'endpoint': endpoint}, entry['retries']) for phase, endpoint, entry in per_endpoint])
+        metric('api_response_bytes_total', 'counter', "Bytes of API responses.",
+               [({'phase': phase, 'endpoint': endpoint}, entry['bytes']) for phase, endpoint, entry in per_endpoint])
+        metric('api_latency_seconds', 'summary', "API call latency.",
+               [({'phase': phase, 'endpoint': endpoint, 'quantile': quantile}, latency)
+                for phase, endpoint, entry in per_endpoint for quantile, latency in entry['latency'].items()])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Save the metrics as Prometheus text (.prom) or JSON, replacing the file in one step."""
+        with self._write_lock:
+            temporary_path = path + '.tmp'
+            with open(temporary_path, 'w') as metrics_file:
+                if path.endswith('.prom'):
+                    metrics_file.write(self.prometheus())
+                else:
+                    json.dump({'phases': self.snapshot(), 'limiters': {'drive': drive_limiter.stats(), 'sheets': sheets_limiter.stats()}},
+                              metrics_file, indent=2)
+            os.replace(temporary_path, path)  # Readers never see a half-written file
+
+metrics = Metrics()
+
+def response_size(response):
+    """Approximate the size of a parsed API response in bytes."""
+    try:
+        return len(json.dumps(response, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+def execute_with_retry(request, limiter, cost=1):
+    """Execute an API request through the rate limiter, retrying with exponential backoff and jitter."""
+    endpoint = getattr(request, 'methodId', None) or limiter.name + '.batch'  # Batch requests have no method id
+    attempt = 0
+    while True:
+        limiter.acquire(cost)
+        started = time.perf_counter()
+        try:
+            response = request.execute()
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not is_retryable_error(e):
+                metrics.record(endpoint, time.perf_counter() - started)
+                raise
+            metrics.record(endpoint, time.perf_counter() - started, retried=True)
+            limiter.on_retry(is_rate_limit_error(e))
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)) + random.uniform(0, 1)
+            print(f"{limiter.name} request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        metrics.record(endpoint, time.perf_counter() - started, response_size(response))
+        limiter.on_success()
+        return response
+
+DRIVE_BATCH_SIZE = 100  # Drive accepts at most 100 calls per batch HTTP request
+USE_DRIVE_BATCH = True  # Group per-file metadata lookups into batch requests
+
+def batch_get_files(service, file_ids, fields, callback, limiter=drive_limiter):
+    """Fetch metadata of many files with Drive batch HTTP requests.
+
+    callback(file_id, file, error) is called once per distinct id. Sub-requests that fail
+    with a retryable error are collected and retried in a later batch with backoff, so only
+    the failed calls are sent again.
+    """
+    pending = list(dict.fromkeys(file_id for file_id in file_ids if file_id))
+    attempt = 0
+    while pending:
+        failed = []
+
+        def on_response(file_id, response, exception):
+            if exception is None:
+                callback(file_id, response, None)
+            elif attempt < MAX_RETRIES and is_retryable_error(exception):
+                failed.append(file_id)
+            else:
+                callback(file_id, None, exception)
+
+        for start in range(0, len(pending), DRIVE_BATCH_SIZE):
+            chunk = pending[start:start + DRIVE_BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=on_response)
+            for file_id in chunk:
+                batch.add(service.files().get(fileId=file_id, fields=fields), request_id=file_id)
+            execute_with_retry(batch, limiter, cost=len(chunk))
+        if failed:
+            limiter.on_retry(True)
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)) + random.uniform(0, 1)
+            print(f"{len(failed)} batched {limiter.name} call(s) failed, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+        pending = failed
+
+FOLDER_CACHE_SIZE = 5000  # Maximum number of folder names kept in memory
+
+class FolderNameCache:
+    """Thread-safe, size-bounded cache of Drive folder ID -> folder name (LRU eviction)."""
+    def __init__(self, max_size=FOLDER_CACHE_SIZE):
+        self.max_size = max_size
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, folder_id):
+        """Return the cached folder name, or None if it is not cached."""
+        with self._lock:
+            name = self._names.get(folder_id)
+            if name is None:
+                self.misses += 1
+                return None
+            self._names.move_to_end(folder_id)  # Mark as recently used
+            self.hits += 1
+            return name
+
+    def put(self, folder_id, name):
+        """Store a folder name, evicting the least recently used entries when full."""
+        with self._lock:
+            self._names[folder_id] = name
+            self._names.move_to_end(folder_id)
+            while len(self._names) > self.max_size:
+                self._names.popitem(last=False)
+
+    def lookup(self, service, folder_id):
+        """Return the folder name, asking Drive only on a cache miss."""
+        name = self.get(folder_id)
+        if name is None:
+            name = execute_with_retry(service.files().get(fileId=folder_id, fields="name"), drive_limiter).get('name', '')
+            self.put(folder_id, name)
+        return name
+
+    def prefetch(self, service, folder_ids):
+        """Resolve all uncached folder names up front, in batch requests when enabled."""
+        missing = [folder_id for folder_id in dict.fromkeys(folder_ids) if folder_id and self.get(folder_id) is None]
+        if not missing:
+            return
+        if not USE_DRIVE_BATCH or len(missing) == 1:
+            for folder_id in missing:
+                self.lookup(service, folder_id)
+            return
+
+        def store(folder_id, folder, error):
+            if error is not None:
+                print(f"Warning: Unable to resolve folder {folder_id}: {str(error)}")
+            else:
+                self.put(folder_id, folder.get('name', ''))
+
+        batch_get_files(service, missing, "id, name", store)
+
+    def clear(self):
+        """Drop all cached folder names."""
+        with self._lock:
+            self._names.clear()
+
+folder_name_cache = FolderNameCache()  # Shared by all fetch threads
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+DRIVE_CACHE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'drive_cache.sqlite3')
+PDF_MIME_TYPE = 'application/pdf'
+DRIVE_CACHE_LISTING_VERSION = '2'  # Bump when cached folder listings change shape
+PERIODIC_UPDATE_INTERVAL = 10  # Seconds between Changes API polls
+
+class DriveCache:
+    """On-disk SQLite cache of Drive folder and file metadata, kept fresh with the Changes API."""
+    def __init__(self, path=DRIVE_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self):
+        """Open the database on first use so importing the module does not create it."""
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._create_tables(connection)
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _create_tables(connection):
+        with connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS folders (id TEXT PRIMARY KEY, name TEXT);
+                CREATE TABLE IF NOT EXISTS files (
+                    id TEXT, parent_id TEXT, name TEXT, web_view_link TEXT, position INTEGER,
+                    PRIMARY KEY (id, parent_id));
+                CREATE INDEX IF NOT EXISTS files_by_parent ON files (parent_id, position);
+                CREATE TABLE IF NOT EXISTS listed_folders (id TEXT PRIMARY KEY, listed_at REAL);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            columns = [column[1] for column in connection.execute("PRAGMA table_info(files)")]
+            if 'modified_time' not in columns:  # Caches written before modifiedTime was kept
+                connection.execute("ALTER TABLE files ADD COLUMN modified_time TEXT DEFAULT ''")
+            version = connection.execute("SELECT value FROM meta WHERE key = 'listing_version'").fetchone()
+            if not version or version[0] != DRIVE_CACHE_LISTING_VERSION:
+                # Listings made before they were limited to PDFs are dropped and re-listed on demand
+                connection.execute("DELETE FROM files")
+                connection.execute("DELETE FROM listed_folders")
+                connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('listing_version', ?)",
+                                   (DRIVE_CACHE_LISTING_VERSION,))
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_folders(self):
+        """Return cached folders as [{'id': ..., 'name': ...}], or [] if none are cached."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, name FROM folders ORDER BY name").fetchall()
+        return [{'id': folder_id, 'name': name} for folder_id, name in rows]
+
+    def put_folders(self, folders):
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO folders (id, name) VALUES (?, ?)",
+                                   [(folder['id'], folder['name']) for folder in folders])
+
+    def folder_ids_by_name(self, name):
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM folders WHERE name = ?", (name,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_folder_files(self, folder_id):
+        """Return the cached listing of a folder as Drive file dicts, or None if it was never listed."""
+        with self._lock:
+            if not self._conn.execute("SELECT 1 FROM listed_folders WHERE id = ?", (folder_id,)).fetchone():
+                return None
+            rows = self._conn.execute(
+                "SELECT id, name, web_view_link, modified_time FROM files WHERE parent_id = ? ORDER BY position",
+                (folder_id,)).fetchall()
+        return [{'id': file_id, 'name': name, 'parents': [folder_id], 'webViewLink': url, 'modifiedTime': modified}
+                for file_id, name, url, modified in rows]
+
+    def put_folder_files(self, folder_id, files):
+        """Replace the cached listing of a folder."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE parent_id = ?", (folder_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (id, parent_id, name, web_view_link, modified_time, position) VALUES (?, ?, ?, ?, ?, ?)",
+                [(file['id'], folder_id, file['name'], file.get('webViewLink', ''), file.get('modifiedTime', ''), position)
+                 for position, file in enumerate(files)])
+            self._conn.execute("INSERT OR REPLACE INTO listed_folders (id, listed_at) VALUES (?, ?)", (folder_id, time.time()))
+
+    def forget_listings(self):
+        """Drop all cached folders and folder listings."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM folders")
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM listed_folders")
+            self._conn.execute("DELETE FROM meta WHERE key = 'folders_listed'")
+
+    def apply_change(self, change):
+        """Apply one Changes API entry to the cache.
+
+        Returns the changed file dict if the file still exists, or None if it was removed or trashed.
+        """
+        file_id = change.get('fileId')
+        file = change.get('file')
+        removed = change.get('removed') or not file or file.get('trashed')
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            if removed:
+                self._conn.execute("DELETE FROM folders WHERE id = ?", (file_id,))
+                self._conn.execute("DELETE FROM listed_folders WHERE id = ?", (file_id,))
+                self._conn.execute("DELETE FROM files WHERE parent_id = ?", (file_id,))
+                return None
+            if file.get('mimeType') == FOLDER_MIME_TYPE:
+                self._conn.execute("INSERT OR REPLACE INTO folders (id, name) VALUES (?, ?)", (file_id, file['name']))
+            for parent_id in file.get('parents', []) if file.get('mimeType') == PDF_MIME_TYPE else []:
+                # Only listings we already hold need the file; other folders are listed on demand
+                if self._conn.execute("SELECT 1 FROM listed_folders WHERE id = ?", (parent_id,)).fetchone():
+                    position = self._conn.execute(
+                        "SELECT COALESCE(MAX(position), -1) + 1 FROM files WHERE parent_id = ?", (parent_id,)).fetchone()[0]
+                    self._conn.execute(
+                        "INSERT INTO files (id, parent_id, name, web_view_link, modified_time, position) VALUES (?, ?, ?, ?, ?, ?)",
+                        (file_id, parent_id, file['name'], file.get('webViewLink', ''), file.get('modifiedTime', ''), position))
+        return file
+
+drive_cache = DriveCache()
+displayed_folder_ids = set()  # IDs of the folders whose files are shown in the tree
+
+TREE_COLUMNS = ("Check", "NO", "GS-name", "Index", "File Name", "Folder Name", "GS-Column", "URL")
+
+def parse_index(index_str):
+    """Convert an extracted index string to an int, or None if there is none."""
+    try:
+        return int(index_str)
+    except (TypeError, ValueError):
+        return None
+
+class Row:
+    """One file row. Rows live in the row store; the tree only displays them."""
+    __slots__ = ('item_id', 'file_id', 'check', 'number', 'gs_name', 'index', 'file_name', 'folder', 'gs_column', 'url', 'modified')
+
+    def __init__(self, index, file_name, folder, url, file_id=None, number=0, gs_name="", gs_column="", modified=""):
+        self.item_id = None  # Assigned by the row store
+        self.file_id = file_id
+        self.check = ""
+        self.number = number  # "NO" column; 0 means "next free number"
+        self.gs_name = gs_name
+        self.index = index  # Extracted Index number as an int, or None
+        self.file_name = file_name
+        self.folder = sys.intern(folder) if folder else ""  # Many rows share one folder name
+        self.gs_column = gs_column
+        self.url = url
+        self.modified = modified  # Drive modifiedTime (RFC 3339, so it sorts as a string)
+
+    def values(self):
+        """Return the values shown in the tree columns."""
+        return (self.check, self.number, self.gs_name, "" if self.index is None else self.index,
+                self.file_name, self.folder, self.gs_column, self.url)
+
+class RowStore:
+    """Rows of the current run, indexed by tree item id, GS-Column cell and Drive file id."""
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self.rows = {}  # Tree item id -> Row
+        self.order = []  # Rows in display order
+        self.by_cell = {}  # GS-Column cell reference -> list of rows
+        self.by_file = {}  # Drive file id -> list of rows
+        self.last_number = 0  # Highest "NO" value seen
+
+    def _link(self, mapping, key, row):
+        if key not in (None, ""):
+            mapping.setdefault(key, []).append(row)
+
+    def _unlink(self, mapping, key, row):
+        rows = mapping.get(key)
+        if rows and row in rows:
+            rows.remove(row)
+            if not rows:
+                del mapping[key]
+
+    def add(self, row):
+        """Register a new row, giving it a tree item id and, if unset, the next "NO" value."""
+        with self._lock:
+            row.item_id = f"row{next(self._ids)}"
+            if not row.number:
+                row.number = self.last_number + 1
+            self.last_number = max(self.last_number, row.number)
+            self.rows[row.item_id] = row
+            self.order.append(row)
+            self._link(self.by_cell, row.gs_column, row)
+            self._link(self.by_file, row.file_id, row)
+        return row
+
+    def remove(self, row):
+        """Forget one row."""
+        with self._lock:
+            if self.rows.pop(row.item_id, None) is None:
+                return
+            self.order.remove(row)
+            self._unlink(self.by_cell, row.gs_column, row)
+            self._unlink(self.by_file, row.file_id, row)
+
+    def update(self, row, **changes):
+        """Change row attributes, keeping the lookup indexes in sync."""
+        with self._lock:
+            for field, value in changes.items():
+                if field == 'gs_column':
+                    self._unlink(self.by_cell, row.gs_column, row)
+                    self._link(self.by_cell, value, row)
+                elif field == 'folder':
+                    value = sys.intern(value) if value else ""
+                setattr(row, field, value)
+
+    def get(self, item_id):
+        """Return the row shown as tree item item_id, or None."""
+        with self._lock:
+            return self.rows.get(item_id)
+
+    def rows_for_cell(self, cell_reference):
+        """Return the rows whose GS-Column equals cell_reference."""
+        with self._lock:
+            return list(self.by_cell.get(cell_reference, ()))
+
+    def rows_for_file(self, file_id):
+        """Return the rows showing the Drive file file_id."""
+        with self._lock:
+            return list(self.by_file.get(file_id, ()))
+
+    def snapshot(self):
+        """Return all rows in display order."""
+        with self._lock:
+            return list(self.order)
+
+    def window(self, start, count):
+        """Return count rows starting at display position start."""
+        with self._lock:
+            return self.order[start:start + count]
+
+    def __len__(self):
+        with self._lock:
+            return len(self.rows)
+
+    def clear(self):
+        """Forget all rows."""
+        with self._lock:
+            self.rows = {}
+            self.order = []
+            self.by_cell.clear()
+            self.by_file.clear()
+            self.last_number = 0
+
+row_store = RowStore()  # Source of truth for the rows; the tree is a view of it
+
+UI_DRAIN_INTERVAL_MS = 50  # How often the Tk main loop applies queued updates
+UI_DRAIN_BATCH_SIZE = 2000  # Maximum number of queued callables run per tick
+
+class UIUpdateQueue:
+    """Hands work from worker threads to the Tk main loop, which applies it on a timer.
+
+    Tkinter widgets must only be touched from the main thread. Row changes only mark the
+    view as stale (the row data lives in row_store) and callables are queued; drain() runs
+    the callables in batches and redraws each stale view once per tick.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._stale = set()
+        self._stale_lock = threading.Lock()
+        self.root = None
+
+    def touch(self, view):
+        """Mark a view as needing a redraw."""
+        with self._stale_lock:
+            self._stale.add(view)
+
+    def call(self, func, *args):
+        """Run func(*args) on the Tk main thread."""
+        self._queue.put((func, args))
+
+    def start(self, root):
+        """Start draining the queue from the Tk main loop."""
+        self.root = root
+        root.after(UI_DRAIN_INTERVAL_MS, self.drain)
+
+    def discard(self):
+        """Forget pending redraws (queued callables are kept)."""
+        with self._stale_lock:
+            self._stale.clear()
+
+    def drain(self):
+        """Run up to UI_DRAIN_BATCH_SIZE queued callables, redraw stale views, then reschedule."""
+        for _ in range(UI_DRAIN_BATCH_SIZE):
+            try:
+                func, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except tk.TclError as e:
+                print(f"Warning: UI update skipped: {str(e)}")
+        with self._stale_lock:
+            stale, self._stale = self._stale, set()
+        for view in stale:
+            view.refresh()
+        delay = 1 if not self._queue.empty() else UI_DRAIN_INTERVAL_MS
+        self.root.after(delay, self.drain)
+
+ui_queue = UIUpdateQueue()
+
+def insert_row(tree, row):
+    """Add a row to the row store and schedule a redraw of the tree."""
+    row_store.add(row)
+    if tree is not None:  # No tree in headless runs
+        ui_queue.touch(tree)
+    return row
+
+def remove_row(tree, row):
+    """Remove a row from the row store and schedule a redraw of the tree."""
+    row_store.remove(row)
+    if tree is not None:
+        ui_queue.touch(tree)
+
+def update_row(tree, row, **changes):
+    """Change attributes of a row in the row store and schedule a redraw of the tree."""
+    row_store.update(row, **changes)
+    if tree is not None:
+        ui_queue.touch(tree)
+
+SHEETS_WRITE_BATCH_SIZE = 500  # Maximum number of cells written per values.batchUpdate request
+CELL_REFERENCE_REGEX = re.compile(r'([A-Za-z]+)(\d+)$')
+
 def authenticate():
     """Authenticate with Google APIs."""
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
     creds = None
     if os.path.exists('token.json'):
         creds = Credentials.from_authorized_user_file('token.json')
@@ -38,147 +847,615 @@ def authenticate():
             token.write(creds.to_json())
     return creds
 
+CREDENTIALS_REFRESH_MARGIN = 300  # Refresh the access token this many seconds before it expires
+
+class ClientFactory:
+    """Cached credentials and per-thread Drive/Sheets clients.
+
+    Google libraries are imported on first use, discovery documents are parsed once and
+    every thread gets its own client over its own persistent HTTP connection, since
+    googleapiclient service objects are not thread-safe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._creds = None
+        self._documents = {}  # (api, version) -> parsed discovery document
+        self._local = threading.local()
+
+    def credentials(self):
+        """Return the credentials, loading them once and refreshing them shortly before they expire."""
+        with self._lock:
+            if self._creds is None:
+                self._creds = authenticate()
+            elif self._expires_soon(self._creds) and self._creds.refresh_token:
+                from google.auth.transport.requests import Request
+                self._creds.refresh(Request())
+                with open('token.json', 'w') as token:
+                    token.write(self._creds.to_json())
+            return self._creds
+
+    @staticmethod
+    def _expires_soon(creds):
+        if not creds.valid:
+            return True
+        if creds.expiry is None:
+            return False
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC
+        return creds.expiry - now < datetime.timedelta(seconds=CREDENTIALS_REFRESH_MARGIN)
+
+    def discovery_document(self, api, version):
+        """Return the parsed static discovery document bundled with googleapiclient, or None."""
+        key = (api, version)
+        with self._lock:
+            if key not in self._documents:
+                from googleapiclient import discovery_cache
+                document = discovery_cache.get_static_doc(api, version)
+                self._documents[key] = json.loads(document) if document else None
+            return self._documents[key]
+
+    def _build(self, api, version):
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build, build_from_document
+        http = AuthorizedHttp(self.credentials(), http=httplib2.Http())
+        document = self.discovery_document(api, version)
+        if document is None:
+            return build(api, version, http=http, cache_discovery=False)
+        return build_from_document(document, http=http)
+
+    def client(self, api, version):
+        """Return this thread's client for the given API, building it on first use."""
+        thread_clients = self._local.__dict__.setdefault('clients', {})
+        if (api, version) not in thread_clients:
+            thread_clients[(api, version)] = self._build(api, version)
+        else:
+            self.credentials()  # Proactive refresh; the client shares the credentials object
+        return thread_clients[(api, version)]
+
+    def drive(self):
+        return self.client('drive', 'v3')
+
+    def sheets(self):
+        return self.client('sheets', 'v4')
+
+clients = ClientFactory()
+
+# Filename ID rules, tried in order; the first group of the first matching pattern is the ID.
+# Patterns are searched case-insensitively, so ".PDF" matches too.
+ID_PATTERNS = [
+    r'[a-zA-Z\s]*\s*(\d+)\s*(?:\(\d+\))?\s*\.pdf',  # "Scan 123.pdf", "123 (1).pdf"
+    r'^[a-z]+-\d{4}-(\d+)(?:[-_\s][^.]*)?\.pdf$',  # "INV-2024-00042.pdf"
+    # "00042_scan.pdf", but not dates: "2024-01-15 invoice.pdf", "20240115_scan.pdf", "2024-01 report.pdf"
+    r'^(?!(?:19|20)\d\d[-_]?(?:0[1-9]|1[0-2])[-_]?(?:0[1-9]|[12]\d|3[01])(?!\d))(\d+)[-_\s](?=[^\d.])[^.]*\.pdf$',
+]
+id_rules = []  # Compiled ID_PATTERNS
+
+def set_id_patterns(patterns):
+    """Replace the filename ID rules (compiled once here, not per file)."""
+    global id_rules
+    id_rules = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+set_id_patterns(ID_PATTERNS)
+
+def normalize_id(digits):
+    """Drop leading zeros so '00042' and '42' match the same sheet ID."""
+    return str(int(digits))
+
+def extract_ids(filenames):
+    """Extract the IDs of a whole page of file names at once.
+
+    Each rule is applied to the names no earlier rule matched. Returns (ids, unmatched)
+    where ids holds a normalized ID string or None per name.
+    """
+    ids = [None] * len(filenames)
+    remaining = list(range(len(filenames)))
+    for rule in id_rules:
+        if not remaining:
+            break
+        search = rule.search
+        still_unmatched = []
+        for position in remaining:
+            match = search(filenames[position])
+            if match:
+                ids[position] = normalize_id(match.group(1))
+            else:
+                still_unmatched.append(position)
+        remaining = still_unmatched
+    return ids, len(remaining)
+
 def extract_numbers(filename):
-    """Extract numbers from the file name using regex."""
-    regex = r'[a-zA-Z\s]*\s*(\d+)\s*(?:\(\d+\))?\s*\.pdf'
-    match = re.search(regex, filename)
-    if match:
-        return match.group(1)
-    else:
-        return None
+    """Extract numbers from the file name using the ID rules."""
+    return extract_ids([filename])[0][0]
+
+FOLDER_PICKER_PAGE_SIZE = 1000  # Folders per list request while the picker loads
+FOLDER_SEARCH_DELAY_MS = 300  # Typing pause before a search is sent
+FOLDER_SEARCH_CACHE_SIZE = 100  # Search texts whose results are kept
+
+def quote_query_value(value):
+    """Quote a string for a Drive query, escaping backslashes and single quotes."""
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+def name_matches(name, search):
+    """Local stand-in for Drive's `name contains`, which matches the start of the name's words."""
+    name = name.lower()
+    search = search.lower()
+    return name.startswith(search) or (" " + search) in name
+
+class FolderSearchCache:
+    """Thread-safe LRU cache of folder search text -> complete result list."""
+    def __init__(self, max_size=FOLDER_SEARCH_CACHE_SIZE):
+        self.max_size = max_size
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, search):
+        """Return the folders matching search, or None if neither it nor a shorter prefix of it is cached."""
+        with self._lock:
+            if search in self._results:
+                self._results.move_to_end(search)
+                return self._results[search]
+            # A longer search only narrows a shorter one, so filter the longest cached prefix locally
+            prefixes = [cached for cached in self._results if search.lower().startswith(cached.lower())]
+            if not prefixes:
+                return None
+            folders = self._results[max(prefixes, key=len)]
+        return [folder for folder in folders if name_matches(folder['name'], search)]
+
+    def put(self, search, folders):
+        with self._lock:
+            self._results[search] = folders
+            self._results.move_to_end(search)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+folder_search_cache = FolderSearchCache()
+
+class FolderListingThread(threading.Thread):
+    """Lists Drive folders (optionally only those whose name contains search) page by page.
+
+    on_page(thread, folders) is called on the Tk main thread for every page and
+    on_done(thread, folders) once with the complete list, or None if listing failed.
+    """
+    def __init__(self, search, on_page, on_done):
+        super().__init__(daemon=True)
+        self.search = search
+        self.on_page = on_page
+        self.on_done = on_done
+        self.cancelled = False  # Set when a newer search replaces this one
+
+    def run(self):
+        service = clients.drive()
+        query = f"mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+        if self.search:
+            query += f" and name contains {quote_query_value(self.search)}"
+        folders = []
+        page_token = None
+        try:
+            start_drive_changes(service)  # Before listing, so nothing changed meanwhile is missed
+            while not self.cancelled:
+                response = execute_with_retry(service.files().list(
+                    q=query, fields="nextPageToken, files(id, name)", orderBy="name",
+                    pageSize=FOLDER_PICKER_PAGE_SIZE, pageToken=page_token), drive_limiter)
+                page = response.get('files', [])
+                folders.extend(page)
+                ui_queue.call(self.on_page, self, page)
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
+        except Exception as e:
+            print_to_console(f"Error listing folders: {str(e)}")
+            ui_queue.call(self.on_done, self, None)
+            return
+        if not self.cancelled:
+            if not self.search:
+                drive_cache.put_folders(folders)
+                drive_cache.set_meta('folders_listed', '1')  # The folders table now holds every folder
+            for folder in folders:
+                folder_name_cache.put(folder['id'], folder['name'])
+            folder_search_cache.put(self.search, folders)
+            ui_queue.call(self.on_done, self, folders)
 
 def select_folders(tree):
-    """Select folders from Google Drive."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
-    folders = service.files().list(
-        q="mimeType='application/vnd.google-apps.folder'",
-        fields="files(id, name)").execute().get('files', [])
-    selected_folders = []
-    if folders:
-        popup = tk.Toplevel()
-        popup.title("Select Folders")
-        popup.geometry("400x300")
-        popup.attributes('-topmost', True)
-
-        # Create a canvas with a scrollbar
-        canvas = tk.Canvas(popup)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar = tk.Scrollbar(popup, orient=tk.VERTICAL, command=canvas.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        # Create a frame inside the canvas
-        frame = tk.Frame(canvas)
-        canvas.create_window((0, 0), window=frame, anchor=tk.NW)
-
-        # Function to update canvas scrollregion
-        def configure_scrollregion(event):
-            canvas.configure(scrollregion=canvas.bbox("all"))
-
-        frame.bind("<Configure>", configure_scrollregion)
-
-        # Function to fetch files data
-        def fetch_files():
-            nonlocal selected_folders
-            index = 1  # Initialize index variable
-            for folder_name in selected_folders:
-                folder_query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder'"
-                folder = service.files().list(q=folder_query, fields="files(id)").execute().get('files', [])
-                if folder:
-                    folder_id = folder[0]['id']
-                    files = service.files().list(q=f"'{folder_id}' in parents", fields="files(id, name, parents, webViewLink)").execute().get('files', [])
-                    for file in files:
-                        file_name = file['name']
-                        index_str = extract_numbers(file_name)
-                        
-                        # Fetch parent folder name
-                        parent_folder_id = file.get('parents', [])[0]
-                        parent_folder = service.files().get(fileId=parent_folder_id, fields="name").execute().get('name', '')
-                        
-                        url = file.get('webViewLink', '')
-                        tree.insert("", "end", values=("", index, "", index_str, file_name, parent_folder, url))
-                        index += 1  # Increment index for each file
-                    
-                    # Update folder_file_count dictionary
-                    folder_file_count[folder_name] = len(files)
-
-                    # Print folder name and file count to console
-                    print_to_console(f"{folder_name} : {len(files)}")
-
-        # Function to get selected folders
-        def get_selected_folders():
-            nonlocal selected_folders
-            for child, var in checkbutton_value.items():
-                if var.get() == 1:  # Check if the checkbutton is selected
-                    selected_folders.append(child.cget("text"))
-            popup.destroy()
-            # Start background fetch thread
-            background_fetch_thread = BackgroundFetchThread(tree, selected_folders)
-            background_fetch_thread.start()
-
-        # Create checkbuttons for folders
-        checkbutton_value = {}  # Initialize checkbutton value dictionary
-        for folder in folders:
-            var = tk.IntVar(value=0)
-            checkbutton = tk.Checkbutton(frame, text=folder['name'], variable=var)
-            checkbutton.pack(anchor=tk.W)
-            checkbutton_value[checkbutton] = var  # Store checkbutton value
-
-        # Create select button
-        select_button = tk.Button(popup, text="Select", command=get_selected_folders)
-        select_button.pack(pady=10)
+    """Select folders from Google Drive.
+
+    The picker opens at once; folders are listed in the background and shown page by page,
+    and typing in the search box lists only the folders whose name contains the text.
+    """
+    # The folders table also holds single name lookups, so it is only the full list once a listing completed
+    fully_listed = drive_cache.get_meta('folders_listed') and drive_cache.get_meta('changes_page_token')
+    cached_folders = drive_cache.get_folders() if fully_listed else []  # Kept up to date by periodic_update
+    if cached_folders:
+        folder_search_cache.put("", cached_folders)
+        for folder in cached_folders:
+            folder_name_cache.put(folder['id'], folder['name'])
+
+    popup = tk.Toplevel()
+    popup.title("Select Folders")
+    popup.geometry("400x400")
+    popup.attributes('-topmost', True)
+
+    search_var = tk.StringVar()
+    search_entry = tk.Entry(popup, textvariable=search_var)
+    search_entry.pack(fill=tk.X, padx=10, pady=(10, 0))
+    status_label = tk.Label(popup, anchor=tk.W)
+    status_label.pack(fill=tk.X, padx=10)
+
+    # A listbox renders thousands of folders at once where one checkbutton per folder cannot
+    list_frame = tk.Frame(popup)
+    list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+    folder_listbox = tk.Listbox(list_frame, selectmode=tk.MULTIPLE, exportselection=False)
+    folder_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar = tk.Scrollbar(list_frame, orient=tk.VERTICAL, command=folder_listbox.yview)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    folder_listbox.configure(yscrollcommand=scrollbar.set)
+
+    shown = []  # Folders in listbox order
+    selected = {}  # Folder ID -> name, kept across searches
+    listing = None  # FolderListingThread feeding the listbox
+    pending_search = None  # after() id of the debounced search
+
+    def show_folders(folders):
+        """Append folders to the listbox, keeping earlier selections selected."""
+        first = len(shown)
+        shown.extend(folders)
+        folder_listbox.insert(tk.END, *[folder['name'] for folder in folders])
+        for position, folder in enumerate(folders, start=first):
+            if folder['id'] in selected:
+                folder_listbox.selection_set(position)
+
+    def on_page(thread, folders):
+        if thread is listing and folders:
+            show_folders(folders)
+            status_label.config(text=f"{len(shown)} folders, loading ...")
+
+    def on_done(thread, folders):
+        if thread is listing:
+            status_label.config(text="Could not list folders" if folders is None else f"{len(shown)} folders")
+
+    def run_search():
+        nonlocal listing, pending_search
+        pending_search = None
+        if listing:
+            listing.cancelled = True
+            listing = None
+        search = search_var.get().strip()
+        shown.clear()
+        folder_listbox.delete(0, tk.END)
+        cached = folder_search_cache.get(search)
+        if cached is not None:
+            show_folders(cached)
+            status_label.config(text=f"{len(shown)} folders")
+            return
+        status_label.config(text="Loading ...")
+        listing = FolderListingThread(search, on_page, on_done)
+        listing.start()
+
+    def on_search_key(event):
+        nonlocal pending_search
+        if pending_search:
+            popup.after_cancel(pending_search)
+        pending_search = popup.after(FOLDER_SEARCH_DELAY_MS, run_search)
+
+    def on_listbox_select(event):
+        picked = set(folder_listbox.curselection())
+        for position, folder in enumerate(shown):
+            if position in picked:
+                selected[folder['id']] = folder['name']
+            else:
+                selected.pop(folder['id'], None)
+
+    def on_close():
+        if listing:
+            listing.cancelled = True
+        popup.destroy()
+
+    # Function to get selected folders
+    def get_selected_folders():
+        selected_folders = [{'id': folder_id, 'name': name} for folder_id, name in selected.items()]
+        on_close()
+        # Start background fetch thread
+        background_fetch_thread = BackgroundFetchThread(tree, selected_folders, recursive=recursive_var.get() == 1)
+        background_fetch_thread.start()
+
+    search_entry.bind("<KeyRelease>", on_search_key)
+    folder_listbox.bind("<<ListboxSelect>>", on_listbox_select)
+    popup.protocol("WM_DELETE_WINDOW", on_close)
+
+    # Create select button
+    recursive_var = tk.IntVar(value=0)
+    recursive_checkbutton = tk.Checkbutton(popup, text="Include subfolders", variable=recursive_var)
+    recursive_checkbutton.pack(pady=(10, 0))
+
+    select_button = tk.Button(popup, text="Select", command=get_selected_folders)
+    select_button.pack(pady=10)
+
+    search_entry.focus_set()
+    run_search()
+
+FETCH_WORKERS = 4  # Number of folders fetched in parallel
+DRIVE_LIST_PAGE_SIZE = 1000  # Largest page files.list returns
+CRAWL_MAX_IN_FLIGHT = 8  # Maximum concurrent list requests while crawling subfolders
+folder_paths = {}  # Folder ID -> full path below the selected folder, filled by recursive crawls
+
+def resolve_folder_ids(service, folder_name):
+    """Return the IDs of the folders called folder_name, from the folder cache or one name query."""
+    folder_ids = drive_cache.folder_ids_by_name(folder_name)
+    if not folder_ids:
+        folders = execute_with_retry(service.files().list(
+            q=f"name={quote_query_value(folder_name)} and mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
+            fields="files(id, name)", pageSize=DRIVE_LIST_PAGE_SIZE), drive_limiter).get('files', [])
+        drive_cache.put_folders(folders)
+        folder_ids = [folder['id'] for folder in folders]
+    if len(folder_ids) > 1:
+        print_to_console(f"{len(folder_ids)} folders are named '{folder_name}'; fetching all of them")
+    elif not folder_ids:
+        print_to_console(f"No folder named '{folder_name}'")
+    return folder_ids
+
+def folder_label(folder):
+    """Display name of a selected folder ({'id', 'name'} dict or plain name)."""
+    return (folder['name'] or folder['id']) if isinstance(folder, dict) else folder
 
 class BackgroundFetchThread(threading.Thread):
-    def __init__(self, tree, selected_folders):
+    def __init__(self, tree, selected_folders, workers=None, recursive=False):
         super().__init__()
         self.tree = tree
         self.selected_folders = selected_folders
+        self.workers = workers or FETCH_WORKERS
+        self.recursive = recursive  # Also fetch the PDFs of all subfolders
+        self._done_lock = threading.Lock()
+        self._folders_done = 0
+        self.unmatched_files = 0  # Files whose name matched no ID rule
+        self.failed_folders = []  # Selected folders that could not be fetched or resolved
+        self._visited_folders = set()  # Folders already crawled, to skip ones reachable by several parents
+        self._crawl_pool = None
+        self.fetched_rows = 0
+        self.use_cache = True  # Read folder listings from the Drive cache when it holds them
 
     def run(self):
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
-        index = 1  # Initialize index variable
-        chunk_size = 10  # Number of files to fetch in each chunk
-        for folder_name in self.selected_folders:
-            folder_query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder'"
-            folder = service.files().list(q=folder_query, fields="files(id)").execute().get('files', [])
-            if folder:
-                folder_id = folder[0]['id']
-                page_token = None
-                while True:
-                    files = service.files().list(q=f"'{folder_id}' in parents", fields="nextPageToken, files(id, name, parents, webViewLink)", pageToken=page_token).execute()
-                    page_token = files.get('nextPageToken')
-                    files = files.get('files', [])
-                    for file in files:
-                        file_name = file['name']
-                        index_str = extract_numbers(file_name)
-                        
-                        # Fetch parent folder name
-                        parent_folder_id = file.get('parents', [])[0]
-                        parent_folder = service.files().get(fileId=parent_folder_id, fields="name").execute().get('name', '')
-                        
-                        url = file.get('webViewLink', '')
-                        self.tree.insert("", "end", values=("", index, "", index_str, file_name, parent_folder,"", url))
-                        index += 1  # Increment index for each file
-                    if not page_token:
-                        break
-                    time.sleep(2)  # Add a delay between each page fetch
+        with metrics.phase('fetch') as phase:
+            self.fetch_all()
+            phase.rows = self.fetched_rows
+
+    def fetch_all(self):
+        @metrics.bind
+        def fetch(folder):
+            return self.fetch_folder(clients.drive(), folder)  # One Drive client per worker thread
+
+        try:
+            refresh_drive_cache(clients.drive(), self.tree)
+        except Exception as e:
+            print_to_console(f"Could not update the Drive cache ({str(e)}); listing folders from Drive")
+            self.use_cache = False
+        workers = max(1, min(self.workers, len(self.selected_folders)))
+        if self.recursive:
+            self._crawl_pool = ThreadPoolExecutor(max_workers=CRAWL_MAX_IN_FLIGHT)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(fetch, folder) for folder in self.selected_folders]
+            # Insert in selection order so the "NO" numbering does not depend on which folder finishes first
+            for folder, future in zip(self.selected_folders, futures):
+                try:
+                    files = future.result()
+                except Exception as e:
+                    print_to_console(f"Error fetching folder '{folder_label(folder)}': {str(e)}")
+                    self.failed_folders.append(folder_label(folder))
+                    continue
+                self.fetched_rows += len(files)
+                self.insert_folder_rows(files)
+        if self._crawl_pool:
+            self._crawl_pool.shutdown()
+        if self.unmatched_files:
+            print_to_console(f"{self.unmatched_files} file name(s) matched no ID pattern")
+        print_to_console(f"Drive requests: {drive_limiter.stats()}")
+
+    def insert_folder_rows(self, rows):
+        """Add the rows of one fetched folder to the tree."""
+        for row in rows:
+            insert_row(self.tree, row)
+
+    def handle_page(self, service, folder_name, files):
+        """Called with every page of files as soon as it is listed (or with a whole cached listing)."""
+
+    def fetch_folder(self, service, folder):
+        """List all PDFs of one folder, returning their (not yet stored) rows.
+
+        folder is a {'id', 'name'} dict from the picker (name None for a --folder-id, looked up here),
+        or a folder name to resolve.
+        """
+        rows = []
+        if isinstance(folder, dict):
+            folder_name = folder['name'] or folder_name_cache.lookup(service, folder['id']) or folder['id']
+            folder_ids = [folder['id']]
+        else:
+            folder_name = folder
+            folder_ids = resolve_folder_ids(service, folder_name)
+            if not folder_ids:
+                with self._done_lock:
+                    self.failed_folders.append(folder_name)
+        for folder_id in folder_ids:
+            folder_name_cache.put(folder_id, folder_name)
+            if self.recursive:
+                rows.extend(self.crawl_folder(folder_name, folder_id))
+                continue
+            displayed_folder_ids.add(folder_id)
+            files = drive_cache.get_folder_files(folder_id) if self.use_cache else None
+            if files is None:
+                files = self.list_folder(service, folder_name, folder_id)
+                drive_cache.put_folder_files(folder_id, files)
+            else:
+                print_to_console(f"{folder_name} : {len(files)} files loaded from cache")
+                self.handle_page(service, folder_name, files)
+            rows.extend(file_rows(service, files))
+        unmatched = sum(1 for row in rows if row.index is None)
+        folder_file_count[folder_name] = len(rows)
+        with self._done_lock:
+            self._folders_done += 1
+            self.unmatched_files += unmatched
+            print_to_console(f"{folder_name} : {len(rows)}, {unmatched} without an ID ({self._folders_done}/{len(self.selected_folders)} folders done)")
+        return rows
+
+    def list_folder(self, service, folder_name, folder_id):
+        """List the PDFs directly inside a folder from Drive."""
+        files = []
+        page_token = None
+        while True:
+            response = execute_with_retry(service.files().list(
+                q=f"{quote_query_value(folder_id)} in parents and mimeType='{PDF_MIME_TYPE}' and trashed=false",
+                fields="nextPageToken, files(id, name, webViewLink, modifiedTime)",
+                pageSize=DRIVE_LIST_PAGE_SIZE, pageToken=page_token), drive_limiter)
+            page_token = response.get('nextPageToken')
+            page = response.get('files', [])
+            for file in page:
+                file['parents'] = [folder_id]  # Known from the query, so not requested
+            self.handle_page(service, folder_name, page)
+            files.extend(page)
+            print_to_console(f"{folder_name} : {len(files)} files fetched...")
+            if not page_token:
+                return files
+
+    def crawl_folder(self, folder_name, folder_id):
+        """Walk a folder tree breadth-first, returning the rows of every PDF with its full folder path."""
+        rows = []
+        with self._done_lock:
+            if folder_id in self._visited_folders:
+                return rows
+            self._visited_folders.add(folder_id)
+        folder_paths[folder_id] = folder_name
+        level = [(folder_id, folder_name)]
+        while level:
+            # List every folder of the current depth concurrently, bounded by the crawl pool size
+            futures = [(path, self._crawl_pool.submit(metrics.bind(self.list_crawl_folder), child_id, path)) for child_id, path in level]
+            level = []
+            for path, future in futures:
+                children = future.result()
+                pdfs = [file for file in children if file.get('mimeType') != FOLDER_MIME_TYPE]
+                ids, _ = extract_ids([file['name'] for file in pdfs])
+                rows.extend(Row(parse_index(file_id), file['name'], path, file.get('webViewLink', ''), file['id'],
+                                modified=file.get('modifiedTime', ''))
+                            for file, file_id in zip(pdfs, ids))
+                for file in children:
+                    if file.get('mimeType') == FOLDER_MIME_TYPE:
+                        with self._done_lock:
+                            if file['id'] in self._visited_folders:
+                                continue
+                            self._visited_folders.add(file['id'])
+                        child_path = f"{path}/{file['name']}"
+                        folder_paths[file['id']] = child_path
+                        folder_name_cache.put(file['id'], file['name'])
+                        level.append((file['id'], child_path))
+            if level:
+                print_to_console(f"{folder_name} : {len(rows)} files, crawling {len(level)} more subfolder(s)...")
+        return rows
+
+    def list_crawl_folder(self, folder_id, path):
+        """List the subfolders and PDFs of one folder (runs on the crawl pool)."""
+        service = clients.drive()
+        displayed_folder_ids.add(folder_id)
+        children = []
+        page_token = None
+        while True:
+            response = execute_with_retry(service.files().list(
+                q=(f"{quote_query_value(folder_id)} in parents and trashed=false"
+                   f" and (mimeType='{FOLDER_MIME_TYPE}' or mimeType='{PDF_MIME_TYPE}')"),
+                fields="nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime)",
+                pageSize=DRIVE_LIST_PAGE_SIZE, pageToken=page_token), drive_limiter)
+            page_token = response.get('nextPageToken')
+            page = response.get('files', [])
+            for file in page:
+                file['parents'] = [folder_id]  # Known from the query, so not requested
+            self.handle_page(service, path, [file for file in page if file['mimeType'] == PDF_MIME_TYPE])
+            children.extend(page)
+            if not page_token:
+                return children
+
+def file_rows(service, files):
+    """Build the rows shown for a page of Drive files, extracting all their IDs in one pass."""
+    ids, _ = extract_ids([file['name'] for file in files])
+    rows = []
+    for file, index_str in zip(files, ids):
+        # Resolve parent folder name (cached, normally no extra request); crawled folders show their full path
+        parents = file.get('parents', [])
+        parent_folder = (folder_paths.get(parents[0]) or folder_name_cache.lookup(service, parents[0])) if parents else ''
+        rows.append(Row(parse_index(index_str), file['name'], parent_folder, file.get('webViewLink', ''), file['id'],
+                        modified=file.get('modifiedTime', '')))
+    return rows
+
+def file_row(service, file):
+    """Build the row shown for a Drive file."""
+    return file_rows(service, [file])[0]
 
 def list_google_sheets(service):
     """List all Google Sheets in Google Drive."""
-    results = service.files().list(
+    results = execute_with_retry(service.files().list(
         q="mimeType='application/vnd.google-apps.spreadsheet'",
-        fields="files(id, name)").execute()
+        fields="files(id, name)"), drive_limiter)
     sheets = results.get('files', [])
     return sheets
 
+SPREADSHEET_METADATA_TTL = 300  # Seconds tab properties and header rows are reused before being re-read
+SPREADSHEET_PROPERTIES_FIELDS = "sheets.properties(sheetId, title, index, gridProperties(rowCount, columnCount))"
+
+class SpreadsheetMetadataCache:
+    """Thread-safe cache of each spreadsheet's tab properties and header rows, expiring after ttl seconds.
+
+    Tab properties come from one field-masked spreadsheets.get (no cell data), so picking a
+    tab, listing its columns and sizing ranges cost a single metadata request per spreadsheet.
+    """
+    def __init__(self, ttl=SPREADSHEET_METADATA_TTL):
+        self.ttl = ttl
+        self._entries = {}  # Key -> (fetched at, value)
+        self._lock = threading.Lock()
+
+    def _cached(self, key, fetch):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+        value = fetch()
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def tabs(self, service, sheet_id):
+        """Return the properties of every tab, in sheet order."""
+        def fetch():
+            sheet = execute_with_retry(service.spreadsheets().get(
+                spreadsheetId=sheet_id, includeGridData=False, fields=SPREADSHEET_PROPERTIES_FIELDS), sheets_limiter)
+            return [tab['properties'] for tab in sheet.get('sheets', [])]
+        return self._cached(('tabs', sheet_id), fetch)
+
+    def tab(self, service, sheet_id, tab_name):
+        """Return the properties of the named tab, or None if there is no such tab."""
+        for properties in self.tabs(service, sheet_id):
+            if properties['title'] == tab_name:
+                return properties
+        return None
+
+    def header(self, service, sheet_id, tab_name, column_count):
+        """Return the values of the tab's first row."""
+        def fetch():
+            range_name = sheet_range(tab_name, f"A1:{column_to_letter(column_count)}1")
+            result = execute_with_retry(service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name), sheets_limiter)
+            values = result.get('values', [])
+            return values[0] if values else []
+        return self._cached(('header', sheet_id, tab_name, column_count), fetch)
+
+    def invalidate(self, sheet_id=None, kind=None):
+        """Forget one spreadsheet (only its 'tabs' or 'header' entries if kind is given), or everything."""
+        with self._lock:
+            for key in list(self._entries):
+                if (sheet_id is None or key[1] == sheet_id) and (kind is None or key[0] == kind):
+                    del self._entries[key]
+
+spreadsheet_metadata = SpreadsheetMetadataCache()
+
 def list_tabs(service, sheet_id):
     """List tabs of a Google Sheet."""
-    sheet = service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-    sheets = sheet.get('sheets', [])
-    tabs = [sheet['properties']['title'] for sheet in sheets]
-    return tabs
+    return [properties['title'] for properties in spreadsheet_metadata.tabs(service, sheet_id)]
 
 def column_to_letter(column):
     """Convert column number to letter."""
@@ -190,31 +1467,18 @@ def column_to_letter(column):
 
 def list_columns(service, sheet_id, tab_name):
     """List columns of a Google Sheets tab."""
-    # Get the spreadsheet
-    sheet = service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-    sheets = sheet.get('sheets', [])
-
-    # Find the specified tab by name
-    tab = None
-    for s in sheets:
-        if s['properties']['title'] == tab_name:
-            tab = s
-            break
+    # Find the specified tab in the cached tab properties
+    tab = spreadsheet_metadata.tab(service, sheet_id, tab_name)
 
     if not tab:
         messagebox.showerror("Error", f"Tab '{tab_name}' not found in the Google Sheet.")
         return []
 
     # Get the total number of columns in the tab
-    total_columns = tab['properties']['gridProperties']['columnCount']
+    total_columns = tab['gridProperties']['columnCount']
 
-    # Construct the range from column A to the last column
-    range_name = f"{tab_name}!A1:{column_to_letter(total_columns)}1"
-
-    # Retrieve values from the specified range to get column names
-    result = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name).execute()
-    values = result.get('values', [])
-    columns = values[0] if values else []
+    # Retrieve the header row from column A to the last column to get column names
+    columns = spreadsheet_metadata.header(service, sheet_id, tab_name, total_columns)
 
     # Create a list of tuples containing column name and its letter identifier
     column_info = [(col_name, column_to_letter(idx + 1)) for idx, col_name in enumerate(columns)]
@@ -223,13 +1487,13 @@ def list_columns(service, sheet_id, tab_name):
 
 service = None  # Define a global variable to store the service object
 sheet_id = None  # Define a global variable to store the sheet ID
+tab_name = None  # Define a global variable to store the selected tab name
 
 def select_sheet(tree):
     """Select Google Sheet from a list."""
     global service  # Access the global service variable
     global sheet_id  # Access the global sheet_id variable
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
+    service = clients.drive()
     sheets = list_google_sheets(service)
     if sheets:
         sheet_names = [sheet['name'] for sheet in sheets]
@@ -259,7 +1523,7 @@ def select_sheet(tree):
             print("Sheet ID:", sheet_id)  # Print sheet ID to console
 
             global service  # Access the global service variable
-            service = build('sheets', 'v4', credentials=creds)  # Use Google Sheets API
+            service = clients.sheets()  # Use Google Sheets API
             tabs = list_tabs(service, sheet_id)
             if tabs:
                 select_tab_window = tk.Toplevel()
@@ -279,7 +1543,9 @@ def select_sheet(tree):
                     tab_listbox.insert(tk.END, tab_name)
 
                 def on_tab_ok():
+                    global tab_name  # Remember the tab so links are written to it
                     selected_tab_name = tab_listbox.get(tk.ACTIVE)
+                    tab_name = selected_tab_name
                     print("Selected Tab:", selected_tab_name)  # Print selected tab to console
                     # Now let's list the columns for the selected tab
                     columns = list_columns(service, sheet_id, selected_tab_name)
@@ -306,7 +1572,8 @@ def select_sheet(tree):
                             select_column_window.destroy()
                             select_tab_window.destroy()
                             sheet_list_window.destroy()
-                            matching_thread = MatchingValuesThread(service, sheet_id, selected_tab_name, selected_columns['IDs'], tree)
+                            # None: the thread builds its own Sheets client, since clients are not thread-safe
+                            matching_thread = MatchingValuesThread(None, sheet_id, selected_tab_name, selected_columns['IDs'], tree)
                             matching_thread.start()
 
                         column_vars = []
@@ -344,22 +1611,206 @@ def select_sheet(tree):
 
 
 def periodic_update(tree):
-    """Periodic update function."""
-    # Implement code to update data in the ttk.Treeview periodically
-  
+    """Periodically apply Drive changes to the local cache and the ttk.Treeview."""
     while True:
-        time.sleep(5)
-        #Sprint("Periodic update")
+        time.sleep(PERIODIC_UPDATE_INTERVAL)
+        if drive_cache.get_meta('changes_page_token') is None:
+            continue  # Nothing fetched yet, so nothing to keep up to date
+        try:
+            sync_drive_changes(clients.drive(), tree)
+        except Exception as e:
+            print(f"Periodic update failed: {str(e)}")
+
+drive_changes_lock = threading.RLock()  # One Changes API sync at a time, so no change is applied twice
+
+def sync_drive_changes(service, tree):
+    """Apply all Drive changes since the stored cursor to the cache and the tree."""
+    with drive_changes_lock:
+        page_token = drive_cache.get_meta('changes_page_token')
+        while page_token:
+            response = execute_with_retry(service.changes().list(
+                pageToken=page_token, pageSize=1000, spaces='drive',
+                fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, parents, trashed, webViewLink, modifiedTime))"), drive_limiter)
+            changes = response.get('changes', [])
+            folder_name_cache.prefetch(service, [change['file']['parents'][0] for change in changes
+                                                 if change.get('file') and change['file'].get('parents')])
+            for change in changes:
+                file = drive_cache.apply_change(change)
+                if file and file.get('mimeType') == FOLDER_MIME_TYPE:
+                    folder_name_cache.put(file['id'], file['name'])
+                apply_change_to_tree(service, tree, change['fileId'], file)
+            if 'newStartPageToken' in response:
+                drive_cache.set_meta('changes_page_token', response['newStartPageToken'])
+                return
+            page_token = response.get('nextPageToken')
+            drive_cache.set_meta('changes_page_token', page_token)
+
+def start_drive_changes(service):
+    """Take a first Changes API cursor.
+
+    Listings cached without a cursor cannot be brought up to date, so they are dropped
+    and listed again from Drive.
+    """
+    with drive_changes_lock:
+        if drive_cache.get_meta('changes_page_token') is not None:
+            return
+        start = execute_with_retry(service.changes().getStartPageToken(), drive_limiter)
+        drive_cache.forget_listings()
+        drive_cache.set_meta('changes_page_token', start['startPageToken'])
+
+def refresh_drive_cache(service, tree):
+    """Bring the Drive cache up to date before a fetch: sync the stored cursor, or take a first one."""
+    with drive_changes_lock:
+        if drive_cache.get_meta('changes_page_token') is None:
+            start_drive_changes(service)
+        else:
+            sync_drive_changes(service, tree)
+
+def apply_change_to_tree(service, tree, file_id, file):
+    """Insert, update or remove the tree rows of one changed Drive file."""
+    rows = row_store.rows_for_file(file_id)
+    shown = (file is not None and file.get('mimeType') == PDF_MIME_TYPE
+             and any(parent in displayed_folder_ids for parent in file.get('parents', [])))
+    if not shown:
+        for row in rows:
+            remove_row(tree, row)
+        return
+    new_row = file_row(service, file)
+    if rows:
+        for row in rows:
+            update_row(tree, row, index=new_row.index, file_name=new_row.file_name, folder=new_row.folder, url=new_row.url,
+                       modified=new_row.modified)
+    else:
+        insert_row(tree, new_row)
+        print_to_console(f"New file in {new_row.folder}: {new_row.file_name}")
 
 def print_to_console(text):
     """Print text to both console and label."""
     print(text)
     
 
+SUMMARY_REFRESH_MS = 1000  # How often the Summary panel re-reads the metrics
+
+def format_phase(summary):
+    """One Summary panel line for a phase summary."""
+    latency = summary['latency']
+    text = f"{summary['phase']}: {summary['seconds']:.1f}s, {summary['rows']} rows"
+    if summary['rows_per_second']:
+        text += f" ({summary['rows_per_second']:.0f}/s)"
+    text += f", {summary['calls']} calls, {summary['bytes'] / 1e6:.1f} MB, {summary['retries']} retries"
+    if latency['0.5'] is not None:
+        text += f", latency p50 {latency['0.5'] * 1000:.0f} / p90 {latency['0.9'] * 1000:.0f} / p99 {latency['0.99'] * 1000:.0f} ms"
+    if summary['peak_memory']:
+        text += f", peak {summary['peak_memory'] / 1e6:.0f} MB"
+    return text + (" (running)" if summary['running'] else "")
+
+class SummaryPanel:
+    """Shows the live per-phase metrics in the Summary frame, one label per phase."""
+    def __init__(self, frame):
+        self.frame = frame
+        self.labels = {}  # Phase name -> Label
+        self.root = None
+
+    def start(self, root):
+        self.root = root
+        self.refresh()
+
+    def refresh(self):
+        for summary in metrics.snapshot():
+            label = self.labels.get(summary['phase'])
+            if label is None:
+                label = self.labels[summary['phase']] = tk.Label(self.frame, anchor=tk.W, justify=tk.LEFT)
+                label.pack(fill=tk.X, padx=5)
+            label.config(text=format_phase(summary))
+        self.root.after(SUMMARY_REFRESH_MS, self.refresh)
+
+VIEW_BUFFER_ROWS = 10  # Rows materialized below the visible ones
+DEFAULT_ROW_HEIGHT = 20
+
+class VirtualTreeView(ttk.Treeview):
+    """Treeview that only materializes the rows currently on screen.
+
+    The rows live in a RowStore; the widget holds just the visible window (plus a small
+    buffer) under the row's own item id, and scrolling re-renders that window, so the
+    number of Tk items stays constant however many rows are loaded.
+    """
+    def __init__(self, master, rows, **kwargs):
+        super().__init__(master, **kwargs)
+        self.rows = rows
+        self.offset = 0  # Display position of the first visible row
+        self.scrollbar = None
+        self.bind("<Configure>", lambda event: self.refresh())
+        self.bind("<MouseWheel>", self._on_mousewheel)
+        self.bind("<Button-4>", lambda event: self._scroll_by(-3))
+        self.bind("<Button-5>", lambda event: self._scroll_by(3))
+
+    def attach_scrollbar(self, scrollbar):
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+
+    def row_height(self):
+        try:
+            return int(ttk.Style().lookup('Treeview', 'rowheight')) or DEFAULT_ROW_HEIGHT
+        except (ValueError, tk.TclError):
+            return DEFAULT_ROW_HEIGHT
+
+    def visible_rows(self):
+        """Number of rows that fit in the widget, not counting the heading."""
+        return max(1, self.winfo_height() // self.row_height() - 1)
+
+    def yview(self, *args):
+        """Scrollbar command: 'moveto fraction' or 'scroll n units|pages'."""
+        if not args:
+            total = max(1, len(self.rows))
+            return self.offset / total, min(1.0, (self.offset + self.visible_rows()) / total)
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * len(self.rows))
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (self.visible_rows() if args[2] == 'pages' else 1)
+            self.offset += step
+        self.refresh()
+        return None
+
+    def _scroll_by(self, rows):
+        self.yview('scroll', rows, 'units')
+        return "break"  # Keep the class binding from scrolling the buffer
+
+    def _on_mousewheel(self, event):
+        return self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def refresh(self):
+        """Re-render the visible window from the row data."""
+        total = len(self.rows)
+        visible = self.visible_rows()
+        self.offset = max(0, min(self.offset, total - visible))
+        selection = set(self.selection())
+        window = self.rows.window(self.offset, visible + VIEW_BUFFER_ROWS)
+        children = self.get_children()
+        if children:
+            self.delete(*children)
+        for row in window:
+            self.insert("", "end", iid=row.item_id, values=row.values())
+        kept = [row.item_id for row in window if row.item_id in selection]
+        if kept:
+            self.selection_set(kept)
+        if self.scrollbar is not None:
+            first, last = self.yview()
+            self.scrollbar.set(first, last)
+
+    def clear(self):
+        """Drop the materialized rows; the row data is cleared by the caller."""
+        self.offset = 0
+        self.refresh()
+
 def main():
     global service  # Access the global service variable
     global sheet_id  # Access the global sheet_id variable
     global tree  # Access the global tree variable
+    global labels_frame
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
+    # Import ttkbootstrap Style
+    from ttkbootstrap import Style
+
     root = tk.Tk()
     root.title("Google Drive File Selection")
 
@@ -367,7 +1818,7 @@ def main():
     style = Style(theme='minty')
     style.configure('TButton', font=('Helvetica', 12))
 
-    tree = ttk.Treeview(root, columns=("Check", "NO",  "GS-name", "Index","File Name", "Folder Name","GS-Column", "URL"), show="headings")
+    tree = VirtualTreeView(root, row_store, columns=TREE_COLUMNS, show="headings")
 
     # Set column headings with left alignment
     tree.heading("Check", text="Check", anchor="w")
@@ -401,9 +1852,9 @@ def main():
     tree.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
 
     # Create vertical scrollbar
-    yscrollbar = ttk.Scrollbar(root, orient='vertical', command=tree.yview)
+    yscrollbar = ttk.Scrollbar(root, orient='vertical')
     yscrollbar.grid(row=1, column=1, sticky='ns')
-    tree.configure(yscrollcommand=yscrollbar.set)
+    tree.attach_scrollbar(yscrollbar)  # The view scrolls over the row data, not over Tk items
     
 # Create the labeled frame
     menu_frame = ttk.LabelFrame(root, text="Menu")
@@ -434,18 +1885,24 @@ def main():
     # Create a frame for labels
     labels_frame = tk.LabelFrame(root, text="Summary")
     labels_frame.grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+    SummaryPanel(labels_frame).start(root)  # Live per-phase metrics
     tree.bind("<Double-1>", lambda event: on_double_click(event, root, tree))
+    ui_queue.start(root)  # Apply row updates queued by the worker threads
+    root.after_idle(lambda: print_to_console(f"Window ready in {time.perf_counter() - START_TIME:.2f}s"))
     root.mainloop()
 def clear_tree(tree):
-    """Clear all items in the ttk.Treeview."""
-    for item in tree.get_children():
-        tree.delete(item)
+    """Clear all rows; only the visible window has Tk items, so this does not depend on the row count."""
+    ui_queue.discard()
+    row_store.clear()
+    tree.clear()
+    displayed_folder_ids.clear()
+    folder_paths.clear()
 def on_double_click(event, root, tree):
     """Copy the URL to the clipboard when double-clicked."""
     item = tree.identify('item', event.x, event.y)  # Identify the item clicked
     if item:
-        values = tree.item(item, "values")
-        url = values[7] if len(values) > 7 else None  # Assuming 'URL' is at index 7 in the values array
+        row = row_store.get(item)
+        url = row.url if row else None
         if url:
             root.clipboard_clear()  # Clear the clipboard
             root.clipboard_append(url)  # Copy the URL to the clipboard
@@ -456,32 +1913,196 @@ def on_double_click(event, root, tree):
 # Bind double-click event to the tree
 
 
+SHEET_READ_WINDOW_ROWS = 10000  # Rows per ranged read of a sheet column
+SHEET_READ_BATCH_GET = True  # Read several windows per values.batchGet request
+SHEET_READ_WINDOWS_PER_BATCH = 5
+
+def read_column_windows(service, sheet_id, tab_name, column, first_row, last_row, on_values):
+    """Read rows first_row..last_row of one column in windows of SHEET_READ_WINDOW_ROWS rows.
+
+    on_values(window_first_row, values) gets each window's values as it arrives, so the
+    caller can fold them into its own structure and only one window is held at a time.
+    """
+    windows = [(start, min(last_row, start + SHEET_READ_WINDOW_ROWS - 1))
+               for start in range(first_row, last_row + 1, SHEET_READ_WINDOW_ROWS)]
+    group_size = SHEET_READ_WINDOWS_PER_BATCH if SHEET_READ_BATCH_GET else 1
+    for group_start in range(0, len(windows), group_size):
+        group = windows[group_start:group_start + group_size]
+        ranges = [sheet_range(tab_name, f"{column}{start}:{column}{end}") for start, end in group]
+        if len(ranges) == 1:
+            value_ranges = [execute_with_retry(service.spreadsheets().values().get(
+                spreadsheetId=sheet_id, range=ranges[0]), sheets_limiter)]
+        else:
+            value_ranges = execute_with_retry(service.spreadsheets().values().batchGet(
+                spreadsheetId=sheet_id, ranges=ranges), sheets_limiter).get('valueRanges', [])
+        for (start, _), value_range in zip(group, value_ranges):
+            on_values(start, value_range.get('values', []))
+        log.debug("Read %s%d:%s%d", column, group[0][0], column, group[-1][1])
+
+class SheetColumnIndex:
+    """Compact index of a sheet ID column: integer ID -> sheet row number(s).
+
+    A row number is stored as an int and only IDs on several rows get a tuple, so a
+    300k-row column costs one small dict. Cell references are built on lookup.
+    """
+    def __init__(self, column):
+        self.column = column
+        self._rows = {}  # ID -> row number, or tuple of row numbers in sheet order
+        self.duplicates = 0  # IDs found on more than one row
+        self.invalid = 0  # Non-empty cells that are not integers
+
+    def add(self, item, row_number):
+        rows = self._rows.get(item)
+        if rows is None:
+            self._rows[item] = row_number
+        elif isinstance(rows, tuple):
+            self._rows[item] = rows + (row_number,)
+        else:
+            self._rows[item] = (rows, row_number)
+            self.duplicates += 1
+
+    def get(self, item, default=None):
+        """Return the cell references of item in sheet order, or default."""
+        rows = self._rows.get(item)
+        if rows is None:
+            return default
+        if isinstance(rows, tuple):
+            return [f"{self.column}{row}" for row in rows]
+        return [f"{self.column}{rows}"]
+
+    def items(self):
+        for item in self._rows:
+            yield item, self.get(item)
+
+    def __contains__(self, item):
+        return item in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
 def fetch_google_sheet_data(service, sheet_id, tab_name, column_letter):
-    """Fetch data from the specified column of the Google Sheet."""
-    range_name = f"{tab_name}!{column_letter}:{column_letter}"
-    result = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name).execute()
-    values = result.get('values', [])
-    
-    # Extract values from the fetched data
-    column_data = {}
-    for row_number, row in enumerate(values, start=1):
-        if row:
-            item = row[0]
-            cell_reference = f"{column_letter}{row_number}"  # Construct cell reference
-            
-            if item:
+    """Fetch the ID column of the Google Sheet into a SheetColumnIndex, reading it in row windows."""
+    column_data = SheetColumnIndex(column_letter)
+    last_filled_row = 0  # Last row a read returned; reads stop at the last non-empty cell
+
+    def add_values(first_row, values):
+        nonlocal last_filled_row
+        last_filled_row = max(last_filled_row, first_row + len(values) - 1)
+        # Extract values from the fetched window; an ID can appear on several sheet rows
+        for row_number, row in enumerate(values, start=first_row):
+            if row and row[0] != "":
+                item = row[0]
                 try:
-                    item = int(item)  # Convert to integer
-                    column_data[item] = cell_reference  # Add item as key and cell_reference as value to the dictionary
+                    column_data.add(int(item), row_number)
                 except ValueError:
-                    print(f"Warning: Unable to convert {item} to an integer.")
-    
-    # Print fetched values for debugging
-    print(f"Selected column {column_letter}: {column_data}")
-    print(f"Total number of items in column {column_letter}: {len(column_data)}")
-    
+                    column_data.invalid += 1
+                    log.debug("Unable to convert %s%d = %r to an integer", column_letter, row_number, item)
+
+    tab = spreadsheet_metadata.tab(service, sheet_id, tab_name) if tab_name else None
+    if tab is None:
+        # No grid size to split by: read the whole column at once
+        range_name = sheet_range(tab_name, f"{column_letter}:{column_letter}")
+        result = execute_with_retry(service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name), sheets_limiter)
+        add_values(1, result.get('values', []))
+    else:
+        first_row = 1
+        row_count = tab['gridProperties']['rowCount']
+        while first_row <= row_count:
+            read_column_windows(service, sheet_id, tab_name, column_letter, first_row, row_count, add_values)
+            first_row = row_count + 1
+            if last_filled_row < row_count:
+                break  # The column ends inside the grid, so a stale cached size lost nothing
+            # Filled up to the cached grid size: rows may have been added since, so re-read the size
+            spreadsheet_metadata.invalidate(sheet_id, 'tabs')
+            tab = spreadsheet_metadata.tab(service, sheet_id, tab_name)
+            row_count = tab['gridProperties']['rowCount'] if tab else 0
+
+    log.info("Column %s: %d IDs, %d on several rows, %d not integers",
+             column_letter, len(column_data), column_data.duplicates, column_data.invalid)
     return column_data
 
+DUPLICATE_POLICIES = ('first', 'newest', 'skip')
+DUPLICATE_POLICY = 'first'  # Which file links an ID that several files or sheet rows share
+
+class MatchResult:
+    """Outcome of joining the file rows against a sheet ID column."""
+    def __init__(self):
+        self.matched = []  # (row, cell reference) pairs to link
+        self.unmatched_files = []  # Rows whose Index is missing or not in the sheet
+        self.unmatched_rows = []  # Sheet cell references no file matched
+        self.ambiguous = {}  # Index -> (cell references, rows) for IDs held by several files or sheet rows
+
+    def summary(self):
+        return (f"{len(self.matched)} matched, {len(self.unmatched_files)} file(s) not in the sheet, "
+                f"{len(self.unmatched_rows)} sheet row(s) without a file, {len(self.ambiguous)} ambiguous ID(s)")
+
+    def report(self):
+        """Return the match sets as plain data (for the --match-report file)."""
+        return {
+            'matched': [{'file': row.file_name, 'file_id': row.file_id, 'cell': cell_reference}
+                        for row, cell_reference in self.matched],
+            'unmatched_files': [{'file': row.file_name, 'file_id': row.file_id, 'index': row.index}
+                                for row in self.unmatched_files],
+            'unmatched_rows': self.unmatched_rows,
+            'ambiguous': [{'index': index, 'cells': cell_references, 'files': [row.file_name for row in rows]}
+                          for index, (cell_references, rows) in self.ambiguous.items()],
+        }
+
+def pick_duplicate(rows, policy):
+    """Return the row that links a shared ID under the duplicate policy, or None to link none."""
+    if policy == 'skip':
+        return None
+    if policy == 'newest':
+        return max(rows, key=lambda row: row.modified or "")  # Ties keep the first row
+    return rows[0]
+
+def group_rows(rows):
+    """Group rows by Index once, so several ID columns can be joined against the same groups.
+
+    Returns (rows_by_index, rows without an Index).
+    """
+    rows_by_index = {}
+    unindexed = []
+    for row in rows:
+        if row.index is None:
+            unindexed.append(row)
+        else:
+            rows_by_index.setdefault(row.index, []).append(row)
+    return rows_by_index, unindexed
+
+def match_rows(column_data, rows, policy=None, grouped=None):
+    """Hash-join rows against column_data (SheetColumnIndex: ID -> [cell references]) in one pass over each side.
+
+    An ID held by several files or sheet rows is ambiguous: its file is chosen by the duplicate
+    policy and it links the first of its sheet rows, or nothing under 'skip'. grouped is the
+    group_rows() of rows, when it was already computed for another ID column.
+    """
+    policy = policy or DUPLICATE_POLICY
+    result = MatchResult()
+    rows_by_index, unindexed = grouped or group_rows(rows)
+    result.unmatched_files.extend(unindexed)
+    for index, index_rows in rows_by_index.items():
+        if index not in column_data:
+            result.unmatched_files.extend(index_rows)
+    for index, cell_references in column_data.items():
+        index_rows = rows_by_index.get(index)
+        if not index_rows:
+            result.unmatched_rows.extend(cell_references)
+            continue
+        row = index_rows[0]
+        if len(index_rows) > 1 or len(cell_references) > 1:
+            result.ambiguous[index] = (cell_references, index_rows)
+            row = pick_duplicate(index_rows, policy)
+        if row is not None:
+            result.matched.append((row, cell_references[0]))
+    return result
+
+def write_match_report(result, path):
+    """Save the match sets as JSON."""
+    with open(path, 'w') as report_file:
+        json.dump(result.report(), report_file, indent=2)
+    print_to_console(f"Match report written to {path}")
+
 
 
     # Assuming 'tree' is a ttk tree widget instance
@@ -529,92 +2150,521 @@ def fetch_google_sheet_data(service, sheet_id, tab_name, column_letter):
     print("Extracted Items:", extracted_items)  # Print the extracted dictionary
     return extracted_items"""
 
+def split_cell_reference(cell_reference):
+    """Split a cell reference like 'T12' into ('T', 12), or return None if it is not one."""
+    match = CELL_REFERENCE_REGEX.match(cell_reference)
+    if not match:
+        return None
+    return match.group(1).upper(), int(match.group(2))
+
+def coalesce_cell_updates(cells):
+    """Merge (column, row, cell_reference, value) tuples into contiguous single-column ranges."""
+    ranges = []
+    run = []
+    for cell in sorted(cells):
+        if run and (cell[0] != run[-1][0] or cell[1] != run[-1][1] + 1):
+            ranges.append(run)
+            run = []
+        run.append(cell)
+    if run:
+        ranges.append(run)
+    return [{
+        'range': f"{run[0][0]}{run[0][1]}:{run[-1][0]}{run[-1][1]}",
+        'values': [[cell[3]] for cell in run],
+    } for run in ranges]
+
+def sheet_range(tab_name, range_name):
+    """Prefix an A1 range with a quoted tab name, if any."""
+    if not tab_name:
+        return range_name
+    return "'" + tab_name.replace("'", "''") + "'!" + range_name
+
+def write_cell_batches(service, sheet_id, cell_values, batch_size, on_result, tab_name=None):
+    """Write {cell_reference: value} to the sheet in values.batchUpdate requests.
+
+    Cells are sorted by column and row, cut into batches of at most batch_size cells and
+    contiguous rows are coalesced into a single range. on_result(cell_references, success, error)
+    is called once per batch. A batch the API rejects is retried as two smaller batches until
+    single cells remain, so one bad cell does not fail its neighbours; a batch that still hits
+    rate limits or server errors after execute_with_retry's retries fails as a whole.
+    """
+    cells = []
+    for cell_reference, value in cell_values.items():
+        parts = split_cell_reference(cell_reference)
+        if parts is None:
+            on_result([cell_reference], False, ValueError(f"Invalid cell reference '{cell_reference}'"))
+            continue
+        cells.append((parts[0], parts[1], cell_reference, value))
+    cells.sort()
+    pending = [cells[start:start + batch_size] for start in range(0, len(cells), batch_size)]
+    pending.reverse()  # Pop batches in sheet order
+    while pending:
+        batch = pending.pop()
+        ranges = coalesce_cell_updates(batch)
+        for r in ranges:
+            r['range'] = sheet_range(tab_name, r['range'])
+        body = {
+            'valueInputOption': 'RAW',
+            'data': ranges,
+        }
+        try:
+            execute_with_retry(service.spreadsheets().values().batchUpdate(spreadsheetId=sheet_id, body=body), sheets_limiter)
+        except Exception as e:
+            if len(batch) > 1 and not is_retryable_error(e):
+                # Fall back to two smaller batches
+                middle = len(batch) // 2
+                pending.append(batch[middle:])
+                pending.append(batch[:middle])
+            else:
+                on_result([cell[2] for cell in batch], False, e)  # Splitting would only spend more quota
+            continue
+        on_result([cell[2] for cell in batch], True)
+
+def read_link_cells(service, sheet_id, cell_references, tab_name=None):
+    """Read the current value of the given cells, with ranged reads over each column's span."""
+    rows_by_column = {}
+    for cell_reference in cell_references:
+        parts = split_cell_reference(cell_reference)
+        if parts:
+            rows_by_column.setdefault(parts[0], []).append(parts[1])
+    current = {}
+    for column, rows in rows_by_column.items():
+        wanted = set(rows)
+
+        def keep_values(first_row, values, column=column, wanted=wanted):
+            for row_number, row in enumerate(values, start=first_row):
+                if row and row[0] != "" and row_number in wanted:
+                    current[f"{column}{row_number}"] = row[0]
+
+        read_column_windows(service, sheet_id, tab_name, column, min(rows), max(rows), keep_values)
+    return current
+
+class LinkPlan:
+    """The link cells that need writing, split by what the sheet holds now."""
+    def __init__(self, cell_values, current):
+        self.writes = {}  # Cell reference -> URL still to write
+        self.new = []  # Empty cells
+        self.changed = []  # Cells holding a different value, which is overwritten
+        self.unchanged = []  # Cells already holding the URL
+        for cell_reference, url in cell_values.items():
+            existing = current.get(cell_reference)
+            if existing == url:
+                self.unchanged.append(cell_reference)
+                continue
+            (self.new if existing is None else self.changed).append(cell_reference)
+            self.writes[cell_reference] = url
+
+    def summary(self):
+        return (f"{len(self.writes)} cell(s) to write ({len(self.new)} empty, {len(self.changed)} overwritten), "
+                f"{len(self.unchanged)} already linked")
+
+LINK_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'link_journal')
+
+class LinkJournal:
+    """Append-only journal of the planned and written link cells of one (spreadsheet, tab, column) job.
+
+    Planned cells are recorded before anything is written and every written batch right after
+    it lands, so a run that dies halfway leaves the cells still to write. The file is removed
+    once the job has no failed or outstanding cells.
+    """
+    def __init__(self, sheet_id, tab_name, column, directory=LINK_JOURNAL_DIR):
+        self.job = {'spreadsheet_id': sheet_id, 'tab': tab_name or "", 'column': column}
+        key = json.dumps(self.job, sort_keys=True)
+        self.path = os.path.join(directory, hashlib.sha1(key.encode()).hexdigest()[:16] + '.jsonl')
+        self._lock = threading.Lock()
+
+    def pending(self):
+        """Return {cell_reference: url} planned by earlier runs and not yet written."""
+        planned = {}
+        if not os.path.exists(self.path):
+            return planned
+        with self._lock, open(self.path) as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line of a run that was killed mid-write
+                planned.update(record.get('plan', {}))
+                for cell_reference in record.get('done', ()):
+                    planned.pop(cell_reference, None)
+        return planned
+
+    def _append(self, record):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a') as journal_file:
+                journal_file.write(json.dumps(record) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+    def plan(self, cell_values):
+        self._append({'job': self.job, 'plan': cell_values, 'at': time.time()})
+
+    def done(self, cell_references):
+        self._append({'done': cell_references})
+
+    def finish(self):
+        """Forget a job that has nothing left to write."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
 def start_extract_thread():
-    extract_thread = ExtractItemsThread(tree, service, sheet_id)
+    extract_thread = ExtractItemsThread(tree, None, sheet_id, tab_name=tab_name, confirm=True)  # Builds its own Sheets client
     extract_thread.start()
 
 class ExtractItemsThread(threading.Thread):
-    def __init__(self, tree, service, sheet_id):
+    def __init__(self, tree, service, sheet_id, batch_size=None, tab_name=None, dry_run=False, confirm=False, link_column=None,
+                 cell_values=None, label="", journal_dir=None):
         super().__init__()
         self.tree = tree
-        self.service = service
+        self.service = service  # None: use this thread's own Sheets client
+        self.cell_values = cell_values  # Links to write; None takes them from the rows' GS-Column
+        self.label = label  # Appended to the phase names when several link jobs run at once
         self.sheet_id = sheet_id
+        self.tab_name = tab_name
+        self.batch_size = batch_size or SHEETS_WRITE_BATCH_SIZE
+        self.dry_run = dry_run  # Only report the plan
+        self.confirm = confirm  # Ask before writing (GUI)
+        self.link_column = link_column  # Checked for an interrupted job even when no row links into it
+        self.journals = {}  # Link column -> LinkJournal
+        self.journal_dir = journal_dir or LINK_JOURNAL_DIR
+        self.plan = None
+        self.written_cells = 0
+        self.failed_cells = []
+        self._answered = threading.Event()
+        self._approved = False
 
     def run(self):
-        extracted_items = self.extract_items()
-        self.paste_values_to_sheet(extracted_items)
+        if self.service is None:
+            self.service = clients.sheets()
+        with metrics.phase('plan' + self.label) as phase:
+            extracted_items = self.resume_items(self.extract_items())
+            self.plan = self.plan_writes(extracted_items)
+            phase.rows = len(extracted_items)
+        for cell_reference in self.plan.unchanged:
+            self.update_checkmark(cell_reference, "✔️")
+        if self.dry_run:
+            return
+        if not self.plan.writes:
+            self.finish_journals()
+            return
+        if self.confirm:
+            ui_queue.call(self.ask_to_write)  # Dialogs belong on the Tk main thread
+            self._answered.wait()
+            if not self._approved:
+                print_to_console("Link cancelled; nothing written.")
+                return
+        with metrics.phase('link' + self.label) as phase:  # Timed after the confirmation so waiting on the user is not counted
+            self.write_plan()
+            phase.rows = self.written_cells
+        print_to_console(f"Sheets requests: {sheets_limiter.stats()}")
+
+    def unwritten_cells(self):
+        """Return how many planned cells were neither written nor reported failed, e.g. because the thread died."""
+        if self.plan is None or self.dry_run:
+            return 0
+        return max(0, len(self.plan.writes) - self.written_cells - len(self.failed_cells))
+
+    def write_plan(self):
+        for column, journal in self.journals.items():
+            journal.plan({cell_reference: url for cell_reference, url in self.plan.writes.items()
+                          if split_cell_reference(cell_reference)[0] == column})
+        self.paste_values_to_sheet(self.plan.writes)
+        self.finish_journals()
+
+    def resume_items(self, extracted_items):
+        """Add the cells an interrupted run of the same job planned but never wrote."""
+        columns = {split_cell_reference(cell_reference)[0] for cell_reference in extracted_items
+                   if split_cell_reference(cell_reference)}
+        if self.link_column:
+            columns.add(self.link_column.strip().upper())
+        items = dict(extracted_items)
+        for column in sorted(columns):
+            journal = self.journals[column] = LinkJournal(self.sheet_id, self.tab_name, column, self.journal_dir)
+            pending = journal.pending()
+            if pending:
+                print_to_console(f"Resuming {len(pending)} unfinished link(s) in column {column} from an interrupted run")
+                for cell_reference, url in pending.items():
+                    items.setdefault(cell_reference, url)  # The current rows win
+        return items
+
+    def finish_journals(self):
+        failed_columns = {split_cell_reference(cell_reference)[0] for cell_reference in self.failed_cells
+                          if split_cell_reference(cell_reference)}
+        for column, journal in self.journals.items():
+            if column not in failed_columns:
+                journal.finish()
+
+    def plan_writes(self, extracted_items):
+        """Compare the links with the link column's current contents and keep only the cells that change."""
+        cell_values = {cell_reference: url for cell_reference, url in extracted_items.items() if cell_reference}
+        current = read_link_cells(self.service, self.sheet_id, cell_values, self.tab_name)
+        plan = LinkPlan(cell_values, current)
+        print_to_console(f"Link plan: {plan.summary()}")
+        if plan.changed:
+            print_to_console(f"Overwriting: {', '.join(plan.changed)}")
+        return plan
+
+    def ask_to_write(self):
+        self._approved = messagebox.askyesno("Link URLs", f"{self.plan.summary()}.\n\nWrite them now?")
+        self._answered.set()
 
     def extract_items(self):
+        if self.cell_values is not None:
+            return dict(self.cell_values)
         extracted_items = {}
-        for item in self.tree.get_children():
-            values = self.tree.item(item, "values")
-            gs_column = values[6]  # Assuming 'GS-Column' is at index 6 in the values array
-            url = values[7]  # Assuming 'URL' is at index 7 in the values array
-            extracted_items[gs_column] = url
+        conflicts = 0
+        for row in row_store.snapshot():
+            if not row.gs_column:
+                continue
+            if extracted_items.setdefault(row.gs_column, row.url) != row.url:
+                conflicts += 1  # Another file already links this cell; keep the first
+        if conflicts:
+            print_to_console(f"{conflicts} file(s) point at a cell another file already links; kept the first")
         return extracted_items
 
     def paste_values_to_sheet(self, extracted_items):
-        for cell_reference, url in extracted_items.items():
-            if cell_reference:
-                range_name = f"{cell_reference}:{cell_reference}"
-                value_input_option = 'RAW'
-                value_range_body = {
-                    'values': [[url]]
-                }
-                try:
-                    result = self.service.spreadsheets().values().update(
-                        spreadsheetId=self.sheet_id, range=range_name,
-                        valueInputOption=value_input_option, body=value_range_body).execute()
-                    print(f"URL '{url}' pasted to cell {cell_reference} successfully.")
-                    self.update_checkmark(cell_reference, "✔️")
-                except Exception as e:
-                    print(f"Error occurred while pasting URL '{url}' to cell {cell_reference}: {str(e)}")
-                    self.update_checkmark(cell_reference, "❌")
+        """Paste URLs into the Google Sheet using batched values.batchUpdate requests."""
+        cell_values = {cell_reference: url for cell_reference, url in extracted_items.items() if cell_reference}
+        write_cell_batches(self.service, self.sheet_id, cell_values, self.batch_size, self.on_batch_result, self.tab_name)
+
+    def on_batch_result(self, cell_references, success, error=None):
+        """Report the result of one written batch back to the tree checkmarks."""
+        if success:
+            self.written_cells += len(cell_references)
+            for column, journal in self.journals.items():
+                journal.done([cell_reference for cell_reference in cell_references
+                              if split_cell_reference(cell_reference)[0] == column])
+            print(f"Batch of {len(cell_references)} URL(s) pasted successfully ({cell_references[0]} .. {cell_references[-1]}).")
+        else:
+            self.failed_cells.extend(cell_references)
+            print(f"Error occurred while pasting URL(s) to {', '.join(cell_references)}: {str(error)}")
+        for cell_reference in cell_references:
+            self.update_checkmark(cell_reference, "✔️" if success else "❌")
 
     def update_checkmark(self, cell_reference, checkmark):
-        for item in self.tree.get_children():
-            values = self.tree.item(item, "values")
-            gs_column = values[6]  # Assuming 'GS-Column' is at index 6 in the values array
-            if gs_column == cell_reference:
-                self.tree.item(item, values=(checkmark, *values[1:]))  # Only update the "Check" column
-                break
+        if self.cell_values is not None:
+            return  # The rows' GS-Column belongs to another target
+        for row in row_store.rows_for_cell(cell_reference):
+            update_row(self.tree, row, check=checkmark)  # Only update the "Check" column
+
+STREAM_FLUSH_INTERVAL = 2.0  # Seconds a partial batch may wait before it is written
+
+class SheetLinkWriter(threading.Thread):
+    """Writes (cell, url) links queued by other threads in batches, while they are still being produced."""
+    def __init__(self, service, sheet_id, tab_name, batch_size, on_result, flush_interval=STREAM_FLUSH_INTERVAL, journal=None):
+        super().__init__()
+        self.service = service  # None: use this thread's own Sheets client
+        self.sheet_id = sheet_id
+        self.tab_name = tab_name
+        self.batch_size = batch_size or SHEETS_WRITE_BATCH_SIZE
+        self.on_result = on_result
+        self.flush_interval = flush_interval
+        self.journal = journal  # LinkJournal each batch is planned in before it is written
+        self.completed = False  # Set once everything queued was written or reported failed
+        self._queue = queue.Queue()
+        self._write_queued = metrics.bind(self.write_queued)  # Counted against the phase that creates the writer
+
+    def put(self, cell_reference, url):
+        self._queue.put((cell_reference, url))
+
+    def finish(self):
+        """Write whatever is still queued and stop."""
+        self._queue.put(None)
+
+    def run(self):
+        if self.service is None:
+            self.service = clients.sheets()
+        self._write_queued()
+
+    def write_queued(self):
+        pending = {}
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                link = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                link = False  # Flush interval elapsed
+            if link:
+                pending[link[0]] = link[1]
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if pending and (link is None or link is False or len(pending) >= self.batch_size):
+                if self.journal:
+                    self.journal.plan(pending)
+                write_cell_batches(self.service, self.sheet_id, pending, self.batch_size, self.on_result, self.tab_name)
+                pending = {}
+                deadline = None
+            if link is None:
+                self.completed = True
+                return
+
+class StreamingLinkThread(BackgroundFetchThread):
+    """Fetch, match and link in one pass: every Drive page is matched and its links queued as it arrives."""
+    def __init__(self, tree, selected_folders, service, sheet_id, tab_name, id_column, link_column, workers=None, batch_size=None, recursive=False, duplicate_policy=None,
+                 journal_dir=None):
+        super().__init__(tree, selected_folders, workers, recursive)
+        self.sheets_service = service  # None: use this thread's own Sheets client
+        self.sheet_id = sheet_id
+        self.tab_name = tab_name
+        self.id_column = id_column.upper()
+        self.link_column = link_column.upper()
+        self.batch_size = batch_size
+        self.duplicate_policy = duplicate_policy or DUPLICATE_POLICY
+        self.column_data = {}
+        self.linked = {}  # Cell reference -> row linking it
+        self.link_values = {}  # Link cell -> value it holds once the queued writes land
+        self.unchanged_cells = 0  # Linked cells that already held the URL
+        self.journal = LinkJournal(sheet_id, tab_name, self.link_column, journal_dir or LINK_JOURNAL_DIR)
+        self.ambiguous = set()  # IDs held by several files or sheet rows
+        self._link_lock = threading.Lock()
+        self.writer = None
+        self.written_cells = 0
+        self.failed_cells = []
+
+    def run(self):
+        with metrics.phase('stream') as phase:
+            self.stream()
+            phase.rows = self.fetched_rows
+
+    def stream(self):
+        if self.sheets_service is None:
+            self.sheets_service = clients.sheets()
+        # Load the sheet's ID column once; every page is matched against it
+        self.column_data = fetch_google_sheet_data(self.sheets_service, self.sheet_id, self.tab_name, self.id_column)
+        # ... and the link cells of those rows, so cells that already hold their URL are not rewritten
+        link_cells = [self.link_column + str(split_cell_reference(cell_reference)[1])
+                      for _, cell_references in self.column_data.items() for cell_reference in cell_references]
+        self.link_values = read_link_cells(self.sheets_service, self.sheet_id, link_cells, self.tab_name)
+        self.writer = SheetLinkWriter(None, self.sheet_id, self.tab_name, self.batch_size, self.on_batch_result,
+                                      journal=self.journal)  # Writes with its own client
+        self.writer.start()
+        try:
+            pending = self.journal.pending()
+            if pending:
+                print_to_console(f"Resuming {len(pending)} unfinished link(s) in column {self.link_column} from an interrupted run")
+                for cell_reference, url in pending.items():
+                    self.queue_link(cell_reference, url)
+            self.fetch_all()
+        finally:
+            self.writer.finish()
+            self.writer.join()
+        if self.writer.completed and not self.failed_cells:
+            self.journal.finish()
+        if self.ambiguous:
+            print_to_console(f"{len(self.ambiguous)} ambiguous ID(s) ({self.duplicate_policy}): {sorted(self.ambiguous)}")
+        print_to_console(f"{self.unchanged_cells} link cell(s) already held their URL")
+        print_to_console(f"Sheets requests: {sheets_limiter.stats()}")
+
+    def handle_page(self, service, folder_name, files):
+        for row in file_rows(service, files):
+            if self.claim_cell(row) and not self.queue_link(row.gs_column, row.url):
+                row.check = "✔️"
+            insert_row(self.tree, row)  # Rows appear in arrival order
+
+    def queue_link(self, cell_reference, url):
+        """Queue a link for writing unless the cell will already hold url; returns True if queued."""
+        with self._link_lock:
+            if self.link_values.get(cell_reference) == url:
+                self.unchanged_cells += 1
+                return False
+            self.link_values[cell_reference] = url  # A later duplicate compares against this write
+        self.writer.put(cell_reference, url)
+        return True
+
+    def claim_cell(self, row):
+        """Decide as the row arrives whether it links its sheet row, applying the duplicate policy.
+
+        Files are not all known yet, so a duplicate file can only displace an earlier one under
+        'newest' (its write simply lands later); under 'skip' an ID that turns out to be shared
+        after its first link was queued is reported but stays linked.
+        """
+        cell_references = self.column_data.get(row.index)
+        if not cell_references:
+            return False
+        cell_reference = cell_references[0]
+        link_cell = self.link_column + str(split_cell_reference(cell_reference)[1])
+        with self._link_lock:
+            current = self.linked.get(link_cell)
+            if len(cell_references) > 1 or current is not None:
+                self.ambiguous.add(row.index)
+                if self.duplicate_policy == 'skip' or (current is not None and (
+                        self.duplicate_policy == 'first' or (row.modified or "") <= (current.modified or ""))):
+                    row.gs_name = "duplicate"
+                    return False
+                if current is not None:
+                    update_row(self.tree, current, gs_name="duplicate", gs_column="")
+            self.linked[link_cell] = row
+        row.gs_name = cell_reference
+        row.gs_column = link_cell
+        return True
+
+    def insert_folder_rows(self, rows):
+        pass  # Rows were inserted page by page in handle_page
+
+    def on_batch_result(self, cell_references, success, error=None):
+        if success:
+            self.written_cells += len(cell_references)
+            self.journal.done(cell_references)
+        else:
+            self.failed_cells.extend(cell_references)
+            print(f"Error occurred while pasting URL(s) to {', '.join(cell_references)}: {str(error)}")
+        for cell_reference in cell_references:
+            for row in row_store.rows_for_cell(cell_reference):
+                update_row(self.tree, row, check="✔️" if success else "❌")
 
 
 class MatchingValuesThread(threading.Thread):
-    def __init__(self, service, sheet_id, tab_name, column_letter, tree):
+    def __init__(self, service, sheet_id, tab_name, column_letter, tree, link_column=None, duplicate_policy=None):
         super().__init__()
-        self.service = service
+        self.service = service  # None: use this thread's own Sheets client
         self.sheet_id = sheet_id
         self.tab_name = tab_name
         self.column_letter = column_letter
         self.tree = tree
+        self.link_column = link_column  # Skip the link column popup when given (headless runs)
+        self.duplicate_policy = duplicate_policy or DUPLICATE_POLICY
+        self.matched_values = []  # (row, cell reference) pairs
+        self.match_result = None
         print("Matching thread starting ...")
         
     def run(self):
-        # Extract index column values from the ttk tree
-        index_column_values = self.extract_index_column_values()
-        
+        if self.service is None:
+            self.service = clients.sheets()
+        with metrics.phase('match') as phase:
+            self.match()
+            phase.rows = len(row_store)
+
+    def match(self):
         # Fetch data from the Google Sheet
         column_data = fetch_google_sheet_data(self.service, self.sheet_id, self.tab_name, self.column_letter)
         
         if column_data:
             # Compare values and print matching values with their corresponding dictionary
             matched_values = self.compare_and_print_matching_values(column_data)
-            if matched_values:
-                cell_references, values = zip(*matched_values.items())
-                # Create the popup window
-                self.create_link_popup(cell_references, values, matched_values)
+            self.matched_values = matched_values
+            if matched_values and self.link_column:
+                self.apply_link_column(self.link_column, matched_values)
+            elif matched_values:
+                # Create the popup window on the Tk main thread
+                ui_queue.call(self.create_link_popup, matched_values)
             else:
                 print("No matching values found.")
         else:
             print("No data fetched from Google Sheet.")
     
-    def create_link_popup(self, cell_references, values, matched_values):
+    def create_link_popup(self, matched_values):
         """Create a popup window for entering the link column."""
         # Create a popup window
         popup_window = tk.Toplevel()
         popup_window.title("Enter Link Column")
 
+        # Show what the match found before anything is written
+        summary = tk.Label(popup_window, text=self.match_result.summary(), justify=tk.LEFT, wraplength=400)
+        summary.pack()
+
         # Add a label to the popup window
         label = tk.Label(popup_window, text="Enter the link column (e.g., 'T'): ")
         label.pack()
@@ -624,88 +2674,337 @@ class MatchingValuesThread(threading.Thread):
         entry.pack()
 
         # Add an OK button to confirm the input
-        ok_button = tk.Button(popup_window, text="OK", command=lambda: self.on_ok(entry, popup_window, cell_references, values, matched_values))
+        ok_button = tk.Button(popup_window, text="OK", command=lambda: self.on_ok(entry, popup_window, matched_values))
         ok_button.pack()
 
-    def on_ok(self, entry, popup_window, cell_references, values, matched_values):
+    def on_ok(self, entry, popup_window, matched_values):
         """Handle OK button click in the link column popup."""
         new_column = entry.get().strip().upper()  # Get the entered column value
         popup_window.destroy()  # Close the popup window
+        self.apply_link_column(new_column, matched_values)
 
-        # Create a new dictionary with updated cell references
-        updated_matched_values = {}
-        for value, cell_reference in matched_values.items():
-            updated_cell_reference = new_column + cell_reference[1:]
-            updated_matched_values[value] = updated_cell_reference
-
-        print("Updated Cell References:")
-        for value, updated_cell_reference in updated_matched_values.items():
-            print(f"Value: {value}, Cell Reference: {updated_cell_reference}")
-
-        # Iterate through the ttk tree to update GS-Column for corresponding rows
-        for row_item in self.tree.get_children():
-            row_values = self.tree.item(row_item, "values")
-            index_value = row_values[3] if len(row_values) > 3 else None
-            if index_value is not None and int(index_value) in updated_matched_values:
-                old_reference = updated_matched_values[int(index_value)]
-                row_number = int(old_reference[1:])  # Extract the row number from the old reference
-                updated_reference = new_column + str(row_number)  # Append the new column to the row number
-                self.tree.set(row_item, "GS-Column", updated_reference)
-
-    def extract_index_column_values(self):
-        """Extract index column values from the ttk tree."""
-        index_column_values = []
-        for item in self.tree.get_children():
-            values = self.tree.item(item, "values")
-            # Assume the index value is at index 3 in the values array
-            index_value = values[3] if len(values) > 3 else None
-            if index_value is not None:
-                try:
-                    index_value_int = int(index_value)  # Convert to integer
-                    index_column_values.append(index_value_int)  # Append index value to the array
-                except ValueError:
-                    print(f"Warning: Unable to convert index value '{index_value}' to an integer.")
-        return index_column_values
+    def apply_link_column(self, new_column, matched_values):
+        """Point the GS-Column of every matched row at the same row in the link column."""
+        new_column = new_column.strip().upper()
+        for row, cell_reference in matched_values:
+            updated_reference = new_column + str(split_cell_reference(cell_reference)[1])
+            log.debug("Value: %s, link cell: %s", row.index, updated_reference)
+            update_row(self.tree, row, gs_column=updated_reference)
 
     def compare_and_print_matching_values(self, column_data):
         """Compare values from the Google Sheet column data with index column values and update the GS-name column in the ttk tree."""
-        print("column data in the thread:", column_data)
-        matched_values = {}
+        matched_values = []
         if column_data:
-            print("Matching Values with Dictionary:")
-            children = self.tree.get_children()
-            for i in range(len(children)):  # Iterate over all items in the ttk tree
-                item = children[i]
-                try:
-                    value = int(self.tree.item(item, "values")[3])
-                except ValueError:
-                    print("Warning: Unable to convert index value to an integer.")
-                    continue  # Skip this item and proceed to the next one
-                # Extract value from the 'Index' column ********(assuming it's the 4th column)
-                cell_reference = column_data.get(value)  # Get the cell reference from the column data based on the index value
-                if cell_reference is not None:
-                    print(f"Value: {value}, Cell Reference: {cell_reference}")
-                    self.tree.set(item, "GS-name", cell_reference)  # Update GS-name column in the ttk tree
-                    matched_values[value] = cell_reference
+            result = match_rows(column_data, row_store.snapshot(), self.duplicate_policy)
+            self.match_result = result
+            for row, cell_reference in result.matched:
+                log.debug("Value: %s, Cell Reference: %s", row.index, cell_reference)
+                update_row(self.tree, row, gs_name=cell_reference)  # Update GS-name column in the ttk tree
+            matched = {id(row) for row, _ in result.matched}
+            for index, (cell_references, rows) in result.ambiguous.items():
+                log.info("Ambiguous ID %s: sheet rows %s, files %s", index, ", ".join(cell_references), ", ".join(row.file_name for row in rows))
+                for row in rows:
+                    if id(row) not in matched:
+                        update_row(self.tree, row, gs_name="duplicate", gs_column="")  # Not linked
+            print_to_console(f"Match ({self.duplicate_policy}): {result.summary()}")
+            matched_values = result.matched
         else:
             print("No data fetched from Google Sheet.")
         return matched_values
 
-    def update_tree(self, cell_references, values, matched_values, new_column):
-        """Update the ttk tree with the new cell references."""
-        for item, cell_reference in zip(self.tree.get_children(), cell_references):
-            # Assume 'GS-name' is the column index for the 'GS-name' column
-            # Convert cell_reference to string to perform subscript operation
-            cell_reference_str = str(cell_reference)
-            # Ensure cell_reference_str has at least two characters
-            if len(cell_reference_str) >= 2:
-                updated_cell_reference = new_column + cell_reference_str[1:]
-                self.tree.set(item, "GS-Column", updated_cell_reference)
-            else:
-                print(f"Error: Invalid cell reference format for {cell_reference}")
-
 # Create an instance of the MatchingValuesThread class
 
+TARGET_LOAD_WORKERS = 4  # ID columns of different targets loaded in parallel
+
+class LinkTarget:
+    """One (spreadsheet, tab, ID column, link column) that a run links into."""
+    def __init__(self, spreadsheet_id, tab, id_column, link_column):
+        self.spreadsheet_id = spreadsheet_id
+        self.tab = tab
+        self.id_column = id_column.strip().upper()
+        self.link_column = link_column.strip().upper()
+
+    def __str__(self):
+        return f"{self.spreadsheet_id}/{self.tab}!{self.id_column}->{self.link_column}"
+
+class MultiTargetLinkThread(threading.Thread):
+    """Match the fetched rows against several link targets and write each with its own batched writer.
+
+    The ID columns are loaded concurrently, the rows are grouped by Index once and joined
+    against every target, and each target's links go through their own ExtractItemsThread
+    (diff, journal and batching per target). Rows in the tree keep the single-target columns.
+    """
+    def __init__(self, targets, batch_size=None, duplicate_policy=None, dry_run=False, journal_dir=None):
+        super().__init__()
+        self.targets = targets
+        self.batch_size = batch_size
+        self.duplicate_policy = duplicate_policy or DUPLICATE_POLICY
+        self.dry_run = dry_run
+        self.journal_dir = journal_dir
+        self.results = {}  # LinkTarget -> MatchResult
+        self.writers = {}  # LinkTarget -> ExtractItemsThread
+        self.failed_targets = []  # Targets whose ID column could not be read
+
+    def run(self):
+        with metrics.phase('match') as phase:
+            self.match()
+            phase.rows = len(row_store)
+        for target, result in self.results.items():
+            cell_values = {target.link_column + str(split_cell_reference(cell_reference)[1]): row.url
+                           for row, cell_reference in result.matched}
+            if not cell_values:
+                continue
+            self.writers[target] = ExtractItemsThread(None, None, target.spreadsheet_id, self.batch_size, target.tab,
+                                                      dry_run=self.dry_run, link_column=target.link_column,
+                                                      cell_values=cell_values, label=f" {target}", journal_dir=self.journal_dir)
+        for writer in self.writers.values():
+            writer.start()
+        for writer in self.writers.values():
+            writer.join()
+
+    def load_indexes(self):
+        """Read every target's ID column at the same time."""
+        def load(target):
+            return fetch_google_sheet_data(clients.sheets(), target.spreadsheet_id, target.tab, target.id_column)
+
+        indexes = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(TARGET_LOAD_WORKERS, len(self.targets)))) as pool:
+            futures = [(target, pool.submit(metrics.bind(load), target)) for target in self.targets]
+            for target, future in futures:
+                try:
+                    indexes[target] = future.result()
+                except Exception as e:
+                    self.failed_targets.append(target)
+                    print_to_console(f"Error reading {target}: {str(e)}")
+        return indexes
+
+    def match(self):
+        indexes = self.load_indexes()
+        grouped = group_rows(row_store.snapshot())
+        for target, column_data in indexes.items():
+            result = match_rows(column_data, None, self.duplicate_policy, grouped)
+            self.results[target] = result
+            print_to_console(f"{target}: {result.summary()}")
+
+    def failed_cells(self):
+        return [cell_reference for writer in self.writers.values() for cell_reference in writer.failed_cells]
+
+TARGET_KEYS = ('spreadsheet_id', 'tab', 'id_column', 'link_column')  # Of a config file 'targets' entry
+
+def link_targets(options):
+    """Return the LinkTargets of a run: every --target / 'targets' entry plus the single-target options."""
+    targets = []
+    for target in options.get('targets') or []:
+        if isinstance(target, dict):
+            targets.append(LinkTarget(*[target[key] for key in TARGET_KEYS]))
+        else:
+            targets.append(LinkTarget(*target))
+    if all(options.get(option) for option in ('spreadsheet_id', 'tab', 'link_column')):  # --resume needs no ID column
+        targets.insert(0, LinkTarget(options['spreadsheet_id'], options['tab'], options.get('id_column') or "", options['link_column']))
+    return targets
+
+CLI_OPTIONS = ('folders', 'spreadsheet_id', 'tab', 'id_column', 'link_column', 'workers', 'batch_size', 'stream', 'recursive',
+               'id_patterns', 'duplicates', 'match_report', 'dry_run', 'resume', 'metrics_file', 'profile',
+               'read_window', 'log_level', 'targets', 'journal_dir', 'folder_ids')
+
+def parse_args(argv):
+    """Parse the headless command line, merging in an optional JSON config file."""
+    parser = argparse.ArgumentParser(
+        description="Link Google Drive files into a Google Sheet without the GUI (fetch -> match -> link).")
+    parser.add_argument('--config', help="JSON file with any of: " + ", ".join(CLI_OPTIONS))
+    parser.add_argument('--folders', nargs='+', help="Drive folder names to fetch")
+    parser.add_argument('--folder-id', dest='folder_ids', action='append', metavar='ID',
+                        help="ID of a Drive folder to fetch, e.g. one whose name is not unique (repeatable)")
+    parser.add_argument('--spreadsheet-id', dest='spreadsheet_id', help="ID of the Google Sheet to link into")
+    parser.add_argument('--tab', help="Tab holding the IDs")
+    parser.add_argument('--id-column', dest='id_column', help="Column letter of the ID column (e.g. 'A')")
+    parser.add_argument('--link-column', dest='link_column', help="Column letter the URLs are written to (e.g. 'T')")
+    parser.add_argument('--workers', type=int, help="Number of folders fetched in parallel")
+    parser.add_argument('--batch-size', dest='batch_size', type=int, help="Cells written per batchUpdate request")
+    parser.add_argument('--stream', action='store_true', default=None,
+                        help="Match and link each Drive page as it arrives instead of after the whole fetch")
+    parser.add_argument('--recursive', action='store_true', default=None,
+                        help="Also fetch the PDFs of all subfolders, showing their full folder path")
+    parser.add_argument('--id-pattern', dest='id_patterns', action='append',
+                        help="Regex whose first group is the file ID; tried before the built-in patterns (repeatable)")
+    parser.add_argument('--duplicates', choices=DUPLICATE_POLICIES,
+                        help="Which file links an ID shared by several files or sheet rows (default: first)")
+    parser.add_argument('--match-report', dest='match_report',
+                        help="Write the matched, unmatched and ambiguous sets to this JSON file")
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true', default=None,
+                        help="Report which link cells would be written or skipped, without writing")
+    parser.add_argument('--resume', action='store_true', default=None,
+                        help="Only finish the links an interrupted run left unwritten (no fetch or match)")
+    parser.add_argument('--metrics-file', dest='metrics_file',
+                        help="Write per-phase metrics to this file after every phase (.prom: Prometheus text, else JSON)")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="Profile every phase with cProfile and tracemalloc and write the reports to DIR")
+    parser.add_argument('--read-window', dest='read_window', type=int,
+                        help=f"Rows per ranged read of a sheet column (default {SHEET_READ_WINDOW_ROWS})")
+    parser.add_argument('--log-level', dest='log_level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help="DEBUG also logs every sheet value and match (default INFO)")
+    parser.add_argument('--target', dest='targets', nargs=4, action='append',
+                        metavar=('SPREADSHEET_ID', 'TAB', 'ID_COLUMN', 'LINK_COLUMN'),
+                        help="Another spreadsheet/tab to link the same files into (repeatable)")
+    parser.add_argument('--journal-dir', dest='journal_dir', metavar='DIR',
+                        help="Keep the link journals here instead of link_journal/ next to the script")
+    args = parser.parse_args(argv)
+
+    options = {}
+    if args.config:
+        with open(args.config) as config_file:
+            options.update(json.load(config_file))
+    for option in CLI_OPTIONS:
+        if getattr(args, option) is not None:  # Command line overrides the config file
+            options[option] = getattr(args, option)
+    if isinstance(options.get('folders'), str):
+        options['folders'] = [options['folders']]
+    if isinstance(options.get('folder_ids'), str):
+        options['folder_ids'] = [options['folder_ids']]
+    if options.get('folder_ids'):  # Fetched like folders picked in the GUI; the name is looked up on fetch
+        options['folders'] = (options.get('folders') or []) + [{'id': folder_id, 'name': None}
+                                                                for folder_id in options['folder_ids']]
+    if options.get('targets'):
+        required = () if options.get('resume') else ('folders',)
+    elif options.get('resume'):
+        required = ('spreadsheet_id', 'tab', 'link_column')
+    else:
+        required = CLI_OPTIONS[:5]
+    missing = [option for option in required if not options.get(option)]
+    if missing:
+        parser.error("missing required option(s): " + ", ".join(missing))
+    if options.get('targets'):
+        for target in options['targets']:
+            values = [target.get(key) for key in TARGET_KEYS] if isinstance(target, dict) else list(target)
+            if len(values) != len(TARGET_KEYS) or not all(isinstance(value, str) and value.strip() for value in values):
+                parser.error(f"incomplete target {target!r}: needs " + ", ".join(TARGET_KEYS))
+        single = [option for option in TARGET_KEYS if options.get(option)]
+        needed = [option for option in TARGET_KEYS if option != 'id_column' or not options.get('resume')]
+        missing = [option for option in needed if not options.get(option)]
+        if single and missing:
+            parser.error("missing option(s) of the single target: " + ", ".join(missing))
+        targets = link_targets(options)
+        if options.get('stream') and len(targets) > 1:
+            parser.error("--stream links into a single target")
+        if len(targets) == 1:  # Same as the single-target options
+            target = targets[0]
+            options.update(spreadsheet_id=target.spreadsheet_id, tab=target.tab,
+                           id_column=target.id_column, link_column=target.link_column)
+            options['targets'] = []
+    if options.get('stream') and options.get('dry_run'):
+        parser.error("--dry-run plans the whole run before writing, so it cannot be combined with --stream")
+    return options
+
+def run_headless(options):
+    """Run the fetch, match and link phases without a window. Returns a process exit code.
+
+    The exit code is 1 if a folder could not be fetched, a target could not be read, a worker
+    thread died or any planned cell was not written, so cron jobs notice partial runs.
+    """
+    global METRICS_PATH, PROFILE_DIR, SHEET_READ_WINDOW_ROWS
+    logging.basicConfig(level=options.get('log_level') or LOG_LEVEL, format="%(message)s")
+    METRICS_PATH = options.get('metrics_file') or METRICS_PATH
+    PROFILE_DIR = options.get('profile') or PROFILE_DIR
+    SHEET_READ_WINDOW_ROWS = options.get('read_window') or SHEET_READ_WINDOW_ROWS
+    if options.get('id_patterns'):
+        set_id_patterns(list(options['id_patterns']) + ID_PATTERNS)
+    dead_threads = []
+    default_excepthook = threading.excepthook
+
+    def on_thread_error(args):
+        dead_threads.append(args.thread.name)
+        default_excepthook(args)  # Still print the traceback
+
+    threading.excepthook = on_thread_error
+    try:
+        problems = run_headless_phases(options)
+    finally:
+        threading.excepthook = default_excepthook
+    if dead_threads:
+        problems.append(f"{len(dead_threads)} worker thread(s) died: {', '.join(dead_threads)}")
+    for problem in problems:
+        print_to_console(f"Incomplete run: {problem}")
+    return 1 if problems else 0
+
+def run_headless_phases(options):
+    """Run the headless phases, returning a list of the problems that make the run incomplete."""
+    problems = []
+
+    def check_writer(target, writer):
+        if not options.get('dry_run'):
+            print_to_console(f"{target}: linked {writer.written_cells} cell(s), {len(writer.failed_cells)} failed")
+        if writer.failed_cells:
+            problems.append(f"{target}: {len(writer.failed_cells)} cell(s) failed to write")
+        if writer.unwritten_cells():
+            problems.append(f"{target}: {writer.unwritten_cells()} planned cell(s) were never written")
+
+    def check_fetch(fetch_thread):
+        if fetch_thread.failed_folders:
+            problems.append(f"could not fetch folder(s): {', '.join(fetch_thread.failed_folders)}")
+
+    targets = link_targets(options)
+    if options.get('resume'):
+        for target in targets:
+            extract_thread = ExtractItemsThread(None, None, target.spreadsheet_id, options.get('batch_size'),
+                                                target.tab, dry_run=options.get('dry_run', False),
+                                                link_column=target.link_column, cell_values={}, journal_dir=options.get('journal_dir'))
+            extract_thread.start()
+            extract_thread.join()
+            check_writer(target, extract_thread)
+        return problems
+    if options.get('stream'):
+        stream_thread = StreamingLinkThread(None, options['folders'], None,
+                                            options['spreadsheet_id'], options['tab'], options['id_column'],
+                                            options['link_column'], options.get('workers'), options.get('batch_size'),
+                                            options.get('recursive', False), options.get('duplicates'), options.get('journal_dir'))
+        stream_thread.start()
+        stream_thread.join()
+        print_to_console(f"Linked {stream_thread.written_cells} cell(s), {len(stream_thread.failed_cells)} failed")
+        check_fetch(stream_thread)
+        if stream_thread.failed_cells:
+            problems.append(f"{len(stream_thread.failed_cells)} cell(s) failed to write")
+        return problems
+
+    fetch_thread = BackgroundFetchThread(None, options['folders'], options.get('workers'), options.get('recursive', False))
+    fetch_thread.start()
+    fetch_thread.join()
+    print_to_console(f"Fetched {len(row_store)} files from {len(options['folders'])} folder(s)")
+    check_fetch(fetch_thread)
+
+    if len(targets) > 1:
+        multi_thread = MultiTargetLinkThread(targets, options.get('batch_size'), options.get('duplicates'),
+                                             options.get('dry_run', False), options.get('journal_dir'))
+        multi_thread.start()
+        multi_thread.join()
+        if options.get('match_report'):
+            with open(options['match_report'], 'w') as report_file:
+                json.dump({str(target): result.report() for target, result in multi_thread.results.items()}, report_file, indent=2)
+        for target, writer in multi_thread.writers.items():
+            check_writer(target, writer)
+        if multi_thread.failed_targets:
+            problems.append(f"could not read target(s): {', '.join(str(target) for target in multi_thread.failed_targets)}")
+        return problems
+
+    matching_thread = MatchingValuesThread(None, options['spreadsheet_id'], options['tab'],
+                                           options['id_column'].upper(), None, options['link_column'], options.get('duplicates'))
+    matching_thread.start()
+    matching_thread.join()
+    if matching_thread.match_result and options.get('match_report'):
+        write_match_report(matching_thread.match_result, options['match_report'])
+    if not matching_thread.matched_values:
+        print_to_console("Nothing to link.")
+        return problems
+
+    extract_thread = ExtractItemsThread(None, None, options['spreadsheet_id'], options.get('batch_size'), options['tab'],
+                                        dry_run=options.get('dry_run', False), link_column=options['link_column'],
+                                        journal_dir=options.get('journal_dir'))
+    extract_thread.start()
+    extract_thread.join()
+    check_writer(targets[0], extract_thread)
+    return problems
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_headless(parse_args(sys.argv[1:])))
     main()
 